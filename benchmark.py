@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from file import (
+    DEFAULT_MERGE_CONFIG, OUTPUT_WRITERS, aggregate_customers, finalize_customers,
+    prepare_rows, product_cols, target_sales_experts, write_output,
+)
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 5_000_000]
+DEFAULT_DUPLICATE_RATIO = 0.4
+DEFAULT_RESULTS_DIR = 'benchmark_results'
+
+# Largest number of data rows an xlsx sheet can hold (one row is the header)
+EXCEL_MAX_ROWS = 1_048_575
+
+FIRST_NAMES = [
+    'علی', 'محمد', 'حسین', 'رضا', 'مهدی', 'امیر', 'سارا', 'زهرا', 'فاطمه', 'مریم',
+    'نرگس', 'حمید', 'کاظم', 'یاسر', 'الهام', 'نازنین', 'پریسا', 'سعید', 'مجید', 'لیلا',
+]
+LAST_NAMES = [
+    'رضایی', 'احمدی', 'محمدی', 'حسینی', 'کریمی', 'موسوی', 'جعفری', 'صادقی', 'رحیمی', 'نوری',
+    'قاسمی', 'عباسی', 'کاظمی', 'هاشمی', 'طاهری', 'زارعی', 'یوسفی', 'شریفی', 'باقری', 'اکبری',
+]
+DESCRIPTIONS = ['تماس گرفته شد', 'پاسخ نداد', 'پیگیری مجدد', 'خرید قبلی', 'درخواست مشاوره']
+
+
+def _pick(rng, values, size):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), size)]
+
+
+def _noisy_phones(rng, numbers):
+    """Write 10-digit numbers (9XXXXXXXXX) in the formats seen in real exports"""
+    phones = pd.Series(numbers, dtype=object)
+    n = len(phones)
+    kind = rng.integers(0, 10, n)
+    head, mid, tail = phones.str[:3], phones.str[3:6], phones.str[6:]
+    formats = [
+        '0' + phones,
+        phones,
+        '+98' + phones,
+        '0098' + phones,
+        '0' + head + ' ' + mid + ' ' + tail,
+        '0' + head + '-' + mid + '-' + tail,
+        '+98 ' + head + ' ' + mid + tail,
+        # Extra digits stuck in front of the number
+        pd.Series(_pick(rng, ['1', '22', '313'], n), dtype=object) + '0' + phones,
+    ]
+    noisy = phones.copy()
+    for i, formatted in enumerate(formats):
+        noisy[kind == i] = formatted[kind == i]
+    # Numbers stored as Excel numbers instead of text
+    numeric = kind == 8
+    noisy[numeric] = phones[numeric].astype(np.int64)
+    # Broken values that can't be cleaned into a mobile number
+    broken = kind == 9
+    noisy[broken] = _pick(rng, ['12345', '021-8888', 'نامشخص', None], int(broken.sum()))
+    return noisy.to_numpy()
+
+
+def generate_customer_list(n_rows, duplicate_ratio=DEFAULT_DUPLICATE_RATIO, seed=0):
+    """Build a synthetic customer list with the columns and noise of a real export.
+
+    About duplicate_ratio of the rows repeat a customer that already appears elsewhere,
+    with the phone number written differently and possibly another (or missing) name.
+    """
+    rng = np.random.default_rng(seed)
+    n_customers = max(1, int(round(n_rows * (1 - duplicate_ratio))))
+
+    # One base number, name and expert per customer
+    base_numbers = (9_000_000_000 + rng.choice(999_999_999, n_customers, replace=False)).astype(str)
+    base_names = _pick(rng, FIRST_NAMES, n_customers) + ' ' + _pick(rng, LAST_NAMES, n_customers)
+    base_experts = _pick(rng, target_sales_experts + ['سایر'], n_customers)
+
+    # Every customer appears once, the remaining rows repeat random customers
+    customer = np.concatenate([np.arange(n_customers), rng.integers(0, n_customers, n_rows - n_customers)])
+    rng.shuffle(customer)
+
+    names = base_names[customer]
+    name_kind = rng.random(n_rows)
+    names[name_kind < 0.08] = 'بدون نام'
+    names[(name_kind >= 0.08) & (name_kind < 0.15)] = None
+    with_digits = (name_kind >= 0.15) & (name_kind < 0.2)
+    names[with_digits] = names[with_digits] + ' ' + rng.integers(1, 100, int(with_digits.sum())).astype(str).astype(object)
+
+    experts = base_experts[customer]
+    experts[rng.random(n_rows) < 0.05] = None
+
+    data = {
+        'numberr': _noisy_phones(rng, base_numbers[customer]),
+        'name': names,
+        'sp': experts,
+    }
+    for col in product_cols:
+        data[col] = np.where(rng.random(n_rows) < 0.06, 1.0, np.nan)
+    data['hichi'] = np.where(rng.random(n_rows) < 0.2, 1.0, np.nan)
+    descriptions = _pick(rng, DESCRIPTIONS, n_rows)
+    descriptions[rng.random(n_rows) >= 0.1] = None
+    data['description'] = descriptions
+    return pd.DataFrame(data)
+
+
+def benchmark_merge(df, output_format='xlsx', output_dir=None):
+    """Time each merge stage on df and return the timings with row counts"""
+    config = dict(DEFAULT_MERGE_CONFIG, verbose=False)
+    stages = {}
+
+    start = time.perf_counter()
+    rows, input_cols = prepare_rows(df, config)
+    stages['prepare_rows'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    final_df, _ = aggregate_customers(rows, config)
+    stages['aggregate_customers'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    final_df = finalize_customers(final_df, input_cols, config)
+    stages['finalize_customers'] = time.perf_counter() - start
+
+    # An xlsx sheet can't hold more than EXCEL_MAX_ROWS rows, so that write is skipped
+    if output_format and not (output_format == 'xlsx' and len(final_df) > EXCEL_MAX_ROWS):
+        with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+            path = os.path.join(tmp_dir, 'merged.' + output_format)
+            start = time.perf_counter()
+            write_output(final_df, path, output_format)
+            stages['write_' + output_format] = time.perf_counter() - start
+
+    return {
+        'input_rows': len(df),
+        'valid_phone_rows': len(rows),
+        'total_customers': len(final_df),
+        'stages': stages,
+        'total': sum(stages.values()),
+    }
+
+
+def run_benchmarks(sizes, duplicate_ratio=DEFAULT_DUPLICATE_RATIO, output_format='xlsx', repeat=1, seed=0):
+    runs = []
+    for n_rows in sizes:
+        start = time.perf_counter()
+        df = generate_customer_list(n_rows, duplicate_ratio, seed)
+        generate_seconds = time.perf_counter() - start
+
+        # Keep the fastest time of each stage over the repeats
+        best = None
+        for _ in range(repeat):
+            result = benchmark_merge(df, output_format)
+            if best is None:
+                best = result
+            else:
+                best['stages'] = {stage: min(best['stages'][stage], seconds) for stage, seconds in result['stages'].items()}
+                best['total'] = sum(best['stages'].values())
+        best['duplicate_ratio'] = duplicate_ratio
+        best['generate_seconds'] = generate_seconds
+        runs.append(best)
+
+        stage_text = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in best['stages'].items())
+        print(f"{n_rows} rows -> {best['total_customers']} customers: {stage_text} (total {best['total']:.2f}s)")
+        del df
+    return runs
+
+
+def compare_runs(previous, current):
+    # Print per-stage speedups against an earlier results file
+    previous_runs = {run['input_rows']: run for run in previous['runs']}
+    print("\n=== Compared with previous results ===")
+    for run in current['runs']:
+        old = previous_runs.get(run['input_rows'])
+        if old is None:
+            continue
+        for stage, seconds in run['stages'].items():
+            if stage in old['stages'] and seconds > 0:
+                print(f"{run['input_rows']} rows, {stage}: {old['stages'][stage]:.2f}s -> {seconds:.2f}s ({old['stages'][stage] / seconds:.1f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the customer merge stages on synthetic lists.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="input row counts (default: 10k 100k 1M 5M)")
+    parser.add_argument('--duplicate-ratio', type=float, default=DEFAULT_DUPLICATE_RATIO, help="share of rows repeating another customer")
+    parser.add_argument('--format', choices=sorted(OUTPUT_WRITERS), default='xlsx', help="output format timed in the write stage")
+    parser.add_argument('--no-write', action='store_true', help="skip the write stage")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per size; the fastest time of each stage is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="results JSON file (default: benchmark_results/benchmark_<time>.json)")
+    parser.add_argument('--compare', help="earlier results JSON file to compare against")
+    args = parser.parse_args(argv)
+
+    runs = run_benchmarks(
+        args.sizes, args.duplicate_ratio,
+        output_format=None if args.no_write else args.format,
+        repeat=args.repeat, seed=args.seed,
+    )
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'runs': runs,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        output = os.path.join(DEFAULT_RESULTS_DIR, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nResults saved to '{output}'")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_runs(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import sqlite3
+import json
+import pandas as pd
+from typing import Iterable, List, Optional, Tuple
+
+class CustomerStore:
+    def __init__(self, db_path: str = "customers.db"):
+        """Open the merged customer store and create tables if they don't exist"""
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create necessary tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        # One row per normalized phone number with its merged state.
+        # name/sp/description have no declared type so numbers and text round-trip unchanged.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS customers (
+                numberr TEXT PRIMARY KEY,
+                first_order INTEGER NOT NULL,
+                sp,
+                first_name,
+                first_valid_name,
+                description,
+                flags INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # Store-wide state: next input row position, seen columns and the flag bit layout
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def _get_meta(self, cursor, key: str, default):
+        cursor.execute('SELECT value FROM store_meta WHERE key = ?', (key,))
+        result = cursor.fetchone()
+        return json.loads(result[0]) if result else default
+
+    def _set_meta(self, cursor, key: str, value):
+        cursor.execute('''
+            INSERT OR REPLACE INTO store_meta (key, value)
+            VALUES (?, ?)
+        ''', (key, json.dumps(value)))
+
+    def get_state(self) -> Tuple[int, List[str], Optional[List[str]]]:
+        """Get the next row position, the input columns seen so far and the flag bit layout"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        state = (
+            self._get_meta(cursor, 'next_order', 0),
+            self._get_meta(cursor, 'seen_columns', []),
+            self._get_meta(cursor, 'flag_columns', None),
+        )
+        conn.close()
+        return state
+
+    def upsert_batch(self, customers: Iterable[tuple], row_count: int,
+                     seen_columns: List[str], flag_columns: List[str]):
+        """Merge one batch of per-number states into the store in a single transaction.
+
+        Each item is (numberr, first_order, sp, first_name, first_valid_name, description, flags).
+        Existing numbers keep their first order, sp and first name, gain a first valid name
+        if they had none, append the new description and OR the new product flags.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        stored_flag_columns = self._get_meta(cursor, 'flag_columns', None)
+        if stored_flag_columns is not None and stored_flag_columns != list(flag_columns):
+            conn.close()
+            raise ValueError("Product columns differ from the ones this customer store was built with")
+
+        cursor.executemany('''
+            INSERT INTO customers (numberr, first_order, sp, first_name, first_valid_name, description, flags)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(numberr) DO UPDATE SET
+                first_valid_name = COALESCE(customers.first_valid_name, excluded.first_valid_name),
+                description = CASE
+                    WHEN customers.description IS NULL THEN excluded.description
+                    WHEN excluded.description IS NULL THEN customers.description
+                    ELSE customers.description || ' | ' || excluded.description
+                END,
+                flags = customers.flags | excluded.flags
+        ''', customers)
+
+        seen = self._get_meta(cursor, 'seen_columns', [])
+        seen += [col for col in seen_columns if col not in seen]
+        self._set_meta(cursor, 'seen_columns', seen)
+        self._set_meta(cursor, 'flag_columns', list(flag_columns))
+        self._set_meta(cursor, 'next_order', self._get_meta(cursor, 'next_order', 0) + row_count)
+
+        conn.commit()
+        conn.close()
+
+    def load_customers(self) -> pd.DataFrame:
+        """Get all stored customers in order of first appearance"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT numberr, sp, first_name, first_valid_name, description, flags
+            FROM customers
+            ORDER BY first_order
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+
+        return pd.DataFrame.from_records(
+            rows,
+            columns=['numberr', 'sp', 'first_name', 'first_valid_name', 'description', 'flags'],
+        )
@@ -1,58 +1,341 @@
 import sqlite3
 import json
-from datetime import datetime
-from typing import List, Dict, Optional
+import queue
+import threading
+import atexit
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, List, Dict, Optional
+
+# Queued log/search rows are written together once this many are waiting,
+# or WRITE_FLUSH_INTERVAL seconds after the first one was queued
+WRITE_BATCH_SIZE = 200
+WRITE_FLUSH_INTERVAL = 0.5
+
+# Actions older than this many days are rolled up into weekly counts by compact_actions
+DEFAULT_ACTION_RETENTION_DAYS = 90
+
+# Queue markers for the background writer
+_FLUSH = object()
+_STOP = object()
+
+# Schema changes after the original tables, applied in order to databases whose
+# PRAGMA user_version is below their version number
+MIGRATIONS = [
+    (1, [
+        # get_recent_actions: range on timestamp, already in ORDER BY order
+        'CREATE INDEX IF NOT EXISTS idx_user_actions_timestamp ON user_actions (timestamp)',
+        # get_actions_by_week: equality on (year, week_number), then timestamp order
+        'CREATE INDEX IF NOT EXISTS idx_user_actions_week ON user_actions (year, week_number, timestamp)',
+        # get_search_history: covering index read newest first
+        'CREATE INDEX IF NOT EXISTS idx_search_history_timestamp ON search_history (timestamp, search_query)',
+    ]),
+    (2, [
+        # One row per normalized search query instead of one per search. The old
+        # search_history rows are folded in; that table is no longer written or read.
+        '''
+        CREATE TABLE IF NOT EXISTS search_queries (
+            normalized_query TEXT PRIMARY KEY,
+            query TEXT NOT NULL,
+            use_count INTEGER NOT NULL,
+            last_used TEXT NOT NULL
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO search_queries (normalized_query, query, use_count, last_used)
+        -- With a single MAX() aggregate, SQLite takes the bare search_query from the
+        -- latest row, so each query keeps its latest spelling as save_search does
+        SELECT normalize_search_query(search_query), TRIM(search_query), COUNT(*), MAX(timestamp)
+        FROM search_history
+        WHERE normalize_search_query(search_query) != ''
+        GROUP BY normalize_search_query(search_query)
+        ''',
+        'DROP INDEX IF EXISTS idx_search_history_timestamp',
+        # get_search_history: most recently used first
+        'CREATE INDEX IF NOT EXISTS idx_search_queries_last_used ON search_queries (last_used)',
+    ]),
+    (3, [
+        # Weekly action counts that replace compacted user_actions rows
+        '''
+        CREATE TABLE IF NOT EXISTS action_weekly_summary (
+            year INTEGER NOT NULL,
+            week_number INTEGER NOT NULL,
+            action_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (year, week_number, action_type)
+        ) WITHOUT ROWID
+        ''',
+        # Let compact_actions hand freed pages back to the file system. Existing files
+        # only switch vacuum mode through a full VACUUM, which runs outside a transaction.
+        'PRAGMA auto_vacuum = INCREMENTAL',
+        'VACUUM',
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# The history queries, shared by their getters and explain_query_plans.
+# timestamp starts with the date, so "timestamp >= day" selects the same rows as
+# "date >= day" while letting the timestamp index serve both the filter and the order.
+RECENT_ACTIONS_QUERY = '''
+    SELECT action_type, action_data, timestamp, date
+    FROM user_actions
+    WHERE timestamp >= date('now', '-' || ? || ' days')
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+ACTIONS_BY_WEEK_QUERY = '''
+    SELECT action_type, action_data, timestamp, date
+    FROM user_actions
+    WHERE year = ? AND week_number = ?
+    ORDER BY timestamp DESC
+'''
+SEARCH_HISTORY_QUERY = '''
+    SELECT query
+    FROM search_queries
+    ORDER BY last_used DESC
+    LIMIT ?
+'''
+WEEKLY_SUMMARY_QUERY = '''
+    SELECT action_type, count
+    FROM action_weekly_summary
+    WHERE year = ? AND week_number = ?
+    ORDER BY count DESC
+'''
+# Prefix match as a range on the primary key: every string starting with the prefix
+# sorts between the prefix and the prefix followed by the highest code point
+SEARCH_SUGGESTIONS_QUERY = '''
+    SELECT query
+    FROM search_queries
+    WHERE normalized_query >= ? AND normalized_query < ?
+    ORDER BY use_count DESC, last_used DESC
+    LIMIT ?
+'''
+
+# Arabic letter variants typed on some keyboards, folded into their Persian forms
+_SEARCH_LETTER_FOLDING = str.maketrans({'ي': 'ی', 'ى': 'ی', 'ك': 'ک'})
+
+
+def normalize_search_query(query: str) -> str:
+    """Key of a search query: trimmed, single spaces, case-folded, Persian letter forms"""
+    return ' '.join(str(query).split()).casefold().translate(_SEARCH_LETTER_FOLDING)
 
 class Database:
     def __init__(self, db_path: str = "app_history.db"):
         """Initialize database connection and create tables if they don't exist"""
         self.db_path = db_path
+        # One connection for the life of the app instead of one per call. Flet runs
+        # event handlers on worker threads, so the connection is shared behind a lock.
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        # Set by close(); every later read or write raises instead of touching a closed
+        # connection or queueing rows the stopped writer would never write. Guarded by
+        # its own lock, which no disk I/O is ever done under, so queueing a row never
+        # waits for a write, compaction or query holding self.lock.
+        self.closed = False
+        self.queue_lock = threading.Lock()
+        # WAL appends commits to a log instead of rewriting the database file, and
+        # synchronous=NORMAL only fsyncs at checkpoints (a crash can lose the last
+        # commits but can't corrupt the database)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Used by the search history migration
+        self.conn.create_function('normalize_search_query', 1, normalize_search_query, deterministic=True)
         self.init_database()
+        
+        # app_settings is small and read on every redraw: it is loaded once, reads come
+        # from memory and set_setting writes through to SQLite
+        with self.lock:
+            self.settings: Dict[str, str] = dict(self.conn.execute('SELECT key, value FROM app_settings').fetchall())
+        # (callback, key or None for every key) pairs called after a setting changes
+        self.setting_listeners: List[tuple] = []
+        
+        # log_action and save_search only queue their rows; a background thread writes
+        # them in batched transactions so click handlers never wait for the disk
+        self.write_queue = queue.Queue()
+        self.written_batches = 0
+        self.written_rows = 0
+        self.writer = threading.Thread(target=self._write_loop, name="database-writer", daemon=True)
+        self.writer.start()
+        # Queued rows are still written if the app exits without calling close()
+        atexit.register(self.close)
+    
+    def close(self):
+        """Write all queued rows and close the database connection (once, when the app exits).
+
+        Calling it again does nothing; any other method called afterwards raises
+        sqlite3.ProgrammingError.
+        """
+        with self.queue_lock:
+            if self.closed:
+                return
+            # Rows queued before this point are ahead of _STOP and still get written
+            self.closed = True
+        if self.writer.is_alive():
+            self.write_queue.put(_STOP)
+            self.writer.join()
+        with self.lock:
+            self.conn.close()
+            self.conn = None
+    
+    def _check_open(self):
+        # Call with self.lock held (connection access) or self.queue_lock (queueing)
+        if self.closed:
+            raise sqlite3.ProgrammingError(f"Cannot use {self.db_path}: the database is closed")
+    
+    def _write_loop(self):
+        # Collect queued rows until the batch is full, the flush interval has passed since
+        # its first row, or a flush/stop is requested, then write them in one transaction
+        stop = False
+        while not stop:
+            batch = []
+            item = self.write_queue.get()
+            markers = 1
+            if item is _STOP:
+                stop = True
+            elif item is not _FLUSH:
+                batch.append(item)
+                markers = 0
+                deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+                while len(batch) < WRITE_BATCH_SIZE:
+                    try:
+                        item = self.write_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is _FLUSH or item is _STOP:
+                        markers += 1
+                        stop = item is _STOP
+                        break
+                    batch.append(item)
+            
+            if batch:
+                self._write_batch(batch)
+            for _ in range(len(batch) + markers):
+                self.write_queue.task_done()
+    
+    def _write_batch(self, batch: List[tuple]):
+        # batch holds (table, row) items; every table gets one executemany, all in one commit
+        actions = [row for table, row in batch if table == 'user_actions']
+        searches = [row for table, row in batch if table == 'search_queries']
+        try:
+            with self.lock:
+                if actions:
+                    self.conn.executemany('''
+                        INSERT INTO user_actions (action_type, action_data, timestamp, date, week_number, year)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', actions)
+                if searches:
+                    self.conn.executemany('''
+                        INSERT INTO search_queries (normalized_query, query, use_count, last_used)
+                        VALUES (?, ?, 1, ?)
+                        ON CONFLICT(normalized_query) DO UPDATE SET
+                            query = excluded.query,
+                            use_count = search_queries.use_count + 1,
+                            last_used = excluded.last_used
+                    ''', searches)
+                self.conn.commit()
+            self.written_batches += 1
+            self.written_rows += len(batch)
+        except sqlite3.Error as e:
+            # Keep the writer alive; losing one batch of history is better than all later ones
+            print(f"Error writing {len(batch)} queued rows to {self.db_path}: {e}")
+    
+    def flush(self):
+        """Block until every queued log/search row is written"""
+        # Nothing queued or being written: don't wait for a round trip to the writer
+        if self.writer.is_alive() and self.write_queue.unfinished_tasks:
+            self.write_queue.put(_FLUSH)
+            self.write_queue.join()
+    
+    def queue_depth(self) -> int:
+        """Number of log/search rows waiting to be written"""
+        return self.write_queue.qsize()
+    
+    def get_writer_stats(self) -> Dict:
+        """Queue depth and the batches/rows written so far by the background writer"""
+        return {
+            'queue_depth': self.queue_depth(),
+            'written_batches': self.written_batches,
+            'written_rows': self.written_rows,
+        }
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def init_database(self):
         """Create necessary tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Table for storing user actions/history
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_actions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                action_type TEXT NOT NULL,
-                action_data TEXT,
-                timestamp TEXT NOT NULL,
-                date TEXT NOT NULL,
-                week_number INTEGER,
-                year INTEGER
-            )
-        ''')
-        
-        # Table for storing app settings
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS app_settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
-        ''')
-        
-        # Table for storing search history
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS search_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                search_query TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                date TEXT NOT NULL
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.lock:
+            self._check_open()
+            cursor = self.conn.cursor()
+        
+            # Table for storing user actions/history
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_actions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    action_type TEXT NOT NULL,
+                    action_data TEXT,
+                    timestamp TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    week_number INTEGER,
+                    year INTEGER
+                )
+            ''')
+        
+            # Table for storing app settings
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS app_settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            ''')
+        
+            # Table for storing search history
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS search_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    search_query TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    date TEXT NOT NULL
+                )
+            ''')
+        
+            self.conn.commit()
+            self.migrate()
+    
+    def migrate(self):
+        """Bring an existing database up to SCHEMA_VERSION, one migration per transaction"""
+        with self.lock:
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, statements in MIGRATIONS:
+                if target <= version:
+                    continue
+                for statement in statements:
+                    self.conn.execute(statement)
+                # PRAGMA doesn't accept parameters; target is one of our own integers
+                self.conn.execute(f'PRAGMA user_version = {int(target)}')
+                self.conn.commit()
+    
+    def explain_query_plans(self) -> Dict[str, List[str]]:
+        """EXPLAIN QUERY PLAN of each history query, to check they are served by indexes"""
+        queries = {
+            'get_recent_actions': (RECENT_ACTIONS_QUERY, (7, 50)),
+            'get_actions_by_week': (ACTIONS_BY_WEEK_QUERY, (2024, 1)),
+            'get_actions_by_week (summary)': (WEEKLY_SUMMARY_QUERY, (2024, 1)),
+            'get_search_history': (SEARCH_HISTORY_QUERY, (20,)),
+            'get_search_suggestions': (SEARCH_SUGGESTIONS_QUERY, ('a', 'a\U0010ffff', 8)),
+        }
+        plans = {}
+        with self.lock:
+            self._check_open()
+            for name, (query, params) in queries.items():
+                rows = self.conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+                plans[name] = [row[-1] for row in rows]
+        return plans
     
     def log_action(self, action_type: str, action_data: Optional[Dict] = None):
-        """Log a user action to the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """Log a user action to the database (queued, written in the background)"""
         now = datetime.now()
         timestamp = now.isoformat()
         date = now.strftime("%Y-%m-%d")
@@ -61,29 +344,22 @@ class Database:
         
         action_data_str = json.dumps(action_data) if action_data else None
         
-        cursor.execute('''
-            INSERT INTO user_actions (action_type, action_data, timestamp, date, week_number, year)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (action_type, action_data_str, timestamp, date, week_number, year))
-        
-        conn.commit()
-        conn.close()
+        with self.queue_lock:
+            self._check_open()
+            self.write_queue.put(('user_actions', (action_type, action_data_str, timestamp, date, week_number, year)))
     
     def get_recent_actions(self, days: int = 7, limit: int = 50) -> List[Dict]:
         """Get recent actions from the last N days"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT action_type, action_data, timestamp, date
-            FROM user_actions
-            WHERE date >= date('now', '-' || ? || ' days')
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (days, limit))
+        # Include rows still waiting in the write queue
+        self.flush()
+        with self.lock:
+            self._check_open()
+            cursor = self.conn.cursor()
+            cursor.execute(RECENT_ACTIONS_QUERY, (days, limit))
+            rows = cursor.fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             action_data = json.loads(row[1]) if row[1] else None
             results.append({
                 'action_type': row[0],
@@ -92,88 +368,199 @@ class Database:
                 'date': row[3]
             })
         
-        conn.close()
         return results
     
     def get_actions_by_week(self, week_number: int, year: int) -> List[Dict]:
-        """Get actions for a specific week"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT action_type, action_data, timestamp, date
-            FROM user_actions
-            WHERE week_number = ? AND year = ?
-            ORDER BY timestamp DESC
-        ''', (week_number, year))
+        """Get actions for a specific week.
+
+        Every item has a 'count': 1 for a logged action, or the number of actions of one
+        type for a week already rolled up by compact_actions (those items have no
+        action_data, timestamp or date).
+        """
+        # Include rows still waiting in the write queue
+        self.flush()
+        with self.lock:
+            self._check_open()
+            cursor = self.conn.cursor()
+            cursor.execute(ACTIONS_BY_WEEK_QUERY, (year, week_number))
+            rows = cursor.fetchall()
+            cursor.execute(WEEKLY_SUMMARY_QUERY, (year, week_number))
+            summary_rows = cursor.fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             action_data = json.loads(row[1]) if row[1] else None
             results.append({
                 'action_type': row[0],
                 'action_data': action_data,
                 'timestamp': row[2],
-                'date': row[3]
+                'date': row[3],
+                'count': 1
+            })
+        for action_type, count in summary_rows:
+            results.append({
+                'action_type': action_type,
+                'action_data': None,
+                'timestamp': None,
+                'date': None,
+                'count': count
             })
         
-        conn.close()
         return results
     
-    def save_search(self, query: str):
-        """Save a search query to history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.now()
-        timestamp = now.isoformat()
-        date = now.strftime("%Y-%m-%d")
+    def compact_actions(self, older_than_days: int = DEFAULT_ACTION_RETENTION_DAYS) -> Dict:
+        """Roll old actions up into weekly counts per action type and delete them.
+
+        Only whole weeks are compacted: everything before the Monday of the week that
+        is older_than_days old. The freed pages are returned to the file system with an
+        incremental vacuum. Returns the number of rows removed and pages freed.
+        """
+        cutoff_day = date.today() - timedelta(days=older_than_days)
+        # Timestamps start with the date, so this compares whole days
+        cutoff = (cutoff_day - timedelta(days=cutoff_day.weekday())).isoformat()
         
-        cursor.execute('''
-            INSERT INTO search_history (search_query, timestamp, date)
-            VALUES (?, ?, ?)
-        ''', (query, timestamp, date))
+        self.flush()
+        with self.lock:
+            self._check_open()
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT INTO action_weekly_summary (year, week_number, action_type, count)
+                SELECT year, week_number, action_type, COUNT(*)
+                FROM user_actions
+                WHERE timestamp < ?
+                GROUP BY year, week_number, action_type
+                ON CONFLICT(year, week_number, action_type) DO UPDATE SET
+                    count = action_weekly_summary.count + excluded.count
+            ''', (cutoff,))
+            cursor.execute('DELETE FROM user_actions WHERE timestamp < ?', (cutoff,))
+            removed = cursor.rowcount
+            self.conn.commit()
+            # Usually nothing is old enough (this runs on every app start): skip the
+            # vacuum and checkpoint rather than hold the connection for them
+            if removed == 0:
+                return {'rows_compacted': 0, 'pages_freed': 0}
+            
+            free_pages = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+            # executescript steps the pragma to completion; a single execute frees one page
+            self.conn.executescript('PRAGMA incremental_vacuum;')
+            # Move the vacuumed pages from the WAL into the file and truncate both
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+            freed = free_pages - self.conn.execute('PRAGMA freelist_count').fetchone()[0]
         
-        conn.commit()
-        conn.close()
+        return {'rows_compacted': removed, 'pages_freed': freed}
+    
+    def save_search(self, query: str):
+        """Save a search query to history (queued, written in the background).
+
+        Queries that normalize to the same text share one row, which counts the uses
+        and keeps the latest spelling and time.
+        """
+        normalized = normalize_search_query(query)
+        if not normalized:
+            return
+        with self.queue_lock:
+            self._check_open()
+            self.write_queue.put(('search_queries', (normalized, query.strip(), datetime.now().isoformat())))
     
     def get_search_history(self, limit: int = 20) -> List[str]:
         """Get recent search queries"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT DISTINCT search_query
-            FROM search_history
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limit,))
-        
-        results = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        # Include rows still waiting in the write queue
+        self.flush()
+        with self.lock:
+            self._check_open()
+            cursor = self.conn.cursor()
+            cursor.execute(SEARCH_HISTORY_QUERY, (limit,))
+            results = [row[0] for row in cursor.fetchall()]
+        
+        return results
+    
+    def get_search_suggestions(self, prefix: str, limit: int = 8) -> List[str]:
+        """Get past queries starting with prefix, most used first (for the search box)"""
+        normalized = normalize_search_query(prefix)
+        if not normalized:
+            return []
+        with self.lock:
+            self._check_open()
+            cursor = self.conn.cursor()
+            cursor.execute(SEARCH_SUGGESTIONS_QUERY, (normalized, normalized + '\U0010ffff', limit))
+            results = [row[0] for row in cursor.fetchall()]
+        
         return results
     
     def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
         """Get a setting value"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT value FROM app_settings WHERE key = ?', (key,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        return result[0] if result else default
+        return self.settings.get(key, default)
+    
+    def get_setting_bool(self, key: str, default: bool = False) -> bool:
+        """Get a setting stored as "1"/"0" (also accepts true/false, yes/no, on/off)"""
+        value = self.settings.get(key)
+        if value is None:
+            return default
+        value = value.strip().lower()
+        if value in ('1', 'true', 'yes', 'on'):
+            return True
+        if value in ('0', 'false', 'no', 'off', ''):
+            return False
+        return default
     
-    def set_setting(self, key: str, value: str):
-        """Set a setting value"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_setting_int(self, key: str, default: int = 0) -> int:
+        """Get an integer setting; default if it is missing or not a number"""
+        try:
+            return int(self.settings[key])
+        except (KeyError, ValueError):
+            return default
+    
+    def get_setting_float(self, key: str, default: float = 0.0) -> float:
+        """Get a float setting; default if it is missing or not a number"""
+        try:
+            return float(self.settings[key])
+        except (KeyError, ValueError):
+            return default
+    
+    def get_setting_json(self, key: str, default: Any = None) -> Any:
+        """Get a setting stored as JSON (lists, dicts, e.g. column layouts)"""
+        try:
+            return json.loads(self.settings[key])
+        except (KeyError, ValueError):
+            return default
+    
+    def set_setting(self, key: str, value: Any):
+        """Set a setting value and notify the listeners if it changed.
+
+        Strings are stored as given, booleans as "1"/"0", lists and dicts as JSON and
+        other values with str().
+        """
+        if isinstance(value, bool):
+            value = '1' if value else '0'
+        elif isinstance(value, (list, dict)):
+            value = json.dumps(value, ensure_ascii=False)
+        elif not isinstance(value, str):
+            value = str(value)
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO app_settings (key, value)
-            VALUES (?, ?)
-        ''', (key, value))
+        with self.lock:
+            self._check_open()
+            if self.settings.get(key) == value:
+                return
+            self.conn.execute('''
+                INSERT OR REPLACE INTO app_settings (key, value)
+                VALUES (?, ?)
+            ''', (key, value))
+            self.conn.commit()
+            self.settings[key] = value
+            listeners = [callback for callback, listen_key in self.setting_listeners if listen_key in (None, key)]
         
-        conn.commit()
-        conn.close()
-
+        # Called outside the lock so a listener can read or set settings itself
+        for callback in listeners:
+            callback(key, value)
+    
+    def add_setting_listener(self, callback: Callable[[str, str], None], key: Optional[str] = None):
+        """Call callback(key, value) after a setting changes (only setting key, if given)"""
+        with self.lock:
+            self.setting_listeners.append((callback, key))
+    
+    def remove_setting_listener(self, callback: Callable[[str, str], None], key: Optional[str] = None):
+        """Stop calling a callback added with add_setting_listener"""
+        with self.lock:
+            self.setting_listeners = [
+                listener for listener in self.setting_listeners if listener != (callback, key)
+            ]
@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+from file import valid_name_mask, write_output
+
+# Characters folded together before comparing names: Arabic/Persian letter variants,
+# and diacritics, tatweel and zero-width characters removed
+PERSIAN_NAME_TRANSLATION = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    'ـ': None, '‌': None, '‍': None, '‏': None, '‎': None,
+    **{chr(code): None for code in range(0x064B, 0x0660)},
+    'ٰ': None,
+})
+
+NGRAM_SIZE = 3
+# Names are compared on their first MAX_NAME_CHARS characters (after normalization)
+MAX_NAME_CHARS = 32
+# MinHash banding: customers land in the same block when all ROWS_PER_BAND min-hashes of
+# one band match. Pairs with n-gram similarity 0.6 meet in at least one of 8 bands of 2
+# rows with probability ~0.98, pairs with similarity 0.2 with ~0.28.
+NUM_BANDS = 8
+ROWS_PER_BAND = 2
+# Blocks with more customers than this (very common names of one expert) are skipped
+DEFAULT_MAX_BLOCK_SIZE = 50
+DEFAULT_MIN_SCORE = 0.6
+# Customers turned into n-gram codes at a time (bounds the code point matrix)
+NGRAM_CHUNK_SIZE = 200000
+# Candidates whose MinHash estimate of the similarity is this far below min_score are
+# dropped before the exact count (a pair at min_score is dropped with probability < 0.5%)
+MINHASH_FILTER_MARGIN = 0.3
+# Candidate pairs scored at a time
+PAIR_CHUNK_SIZE = 500000
+# Prime modulus of the MinHash hash functions (a * x + b) mod p
+HASH_PRIME = (1 << 31) - 1
+
+
+def normalize_names(series):
+    """Normalize Persian names for comparison: fold letter variants, drop diacritics,
+    spaces, digits and punctuation, lowercase Latin letters"""
+    text = pd.Series(series.to_numpy(dtype=object), index=series.index, dtype=object)
+    text = text.where(text.map(lambda value: isinstance(value, str)), '')
+    return text.str.translate(PERSIAN_NAME_TRANSLATION).str.lower().str.replace(r'[\W\d_]+', '', regex=True)
+
+
+def name_ngrams(names, ngram_size=NGRAM_SIZE):
+    """Character n-grams of normalized names as (customer position, int64 code) arrays.
+
+    Each n-gram is packed into one integer (21 bits per code point), so grams are
+    compared as numbers. Names shorter than ngram_size give one gram of the whole name.
+    Every (customer, gram) pair appears once, sorted by customer and then code.
+    """
+    if ngram_size > 3:
+        # Three 21-bit code points are the most that fit in one int64
+        raise ValueError("N-grams longer than 3 characters are not supported")
+    customers, codes = [], []
+    for start in range(0, len(names), NGRAM_CHUNK_SIZE):
+        chunk = np.array(names[start:start + NGRAM_CHUNK_SIZE], dtype=f'U{MAX_NAME_CHARS}')
+        points = chunk.view(np.uint32).reshape(len(chunk), MAX_NAME_CHARS).astype(np.int64)
+        lengths = (points != 0).sum(axis=1)
+
+        gram = np.zeros((len(chunk), MAX_NAME_CHARS - ngram_size + 1), dtype=np.int64)
+        for i in range(ngram_size):
+            gram = (gram << 21) | points[:, i:MAX_NAME_CHARS - ngram_size + 1 + i]
+        # Gram k is complete if the name reaches position k + ngram_size; the first gram
+        # also stands for names shorter than ngram_size
+        positions = np.arange(gram.shape[1])
+        complete = (positions + ngram_size <= lengths[:, None]) | ((positions == 0) & (lengths[:, None] > 0))
+        # Sorting each row puts repeated grams next to each other, so they are dropped
+        # without a separate drop_duplicates pass
+        gram = np.sort(np.where(complete, gram, -1), axis=1)
+        valid = gram >= 0
+        valid[:, 1:] &= gram[:, 1:] != gram[:, :-1]
+
+        rows, cols = np.nonzero(valid)
+        customers.append(rows + start)
+        codes.append(gram[rows, cols])
+
+    return pd.DataFrame({
+        'customer': np.concatenate(customers) if customers else np.zeros(0, dtype=np.int64),
+        'gram': np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64),
+    })
+
+
+def _block_pairs(block, customer):
+    # All (a, b) pairs, a < b, of customers sharing a block; input sorted by block
+    starts = np.flatnonzero(np.r_[True, block[1:] != block[:-1]])
+    sizes = np.diff(np.append(starts, len(block)))
+    offset_in_block = np.arange(len(block)) - np.repeat(starts, sizes)
+    partners = np.repeat(sizes, sizes) - offset_in_block - 1
+
+    total = int(partners.sum())
+    first = np.repeat(np.arange(len(block)), partners)
+    run_starts = np.cumsum(partners) - partners
+    second = first + 1 + (np.arange(total) - np.repeat(run_starts, partners))
+    a, b = customer[first], customer[second]
+    return np.minimum(a, b), np.maximum(a, b)
+
+
+def _min_hashes(customer, gram, n_customers, num_hashes, seed=0):
+    # MinHash signature per customer: for each hash function the smallest hash of its
+    # n-grams. customer must be sorted and every customer must have at least one n-gram.
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, HASH_PRIME, num_hashes)
+    offsets = rng.integers(0, HASH_PRIME, num_hashes)
+    starts = np.searchsorted(customer, np.arange(n_customers))
+    signatures = np.empty((num_hashes, n_customers), dtype=np.int64)
+    for i in range(num_hashes):
+        signatures[i] = np.minimum.reduceat((multipliers[i] * gram + offsets[i]) % HASH_PRIME, starts)
+    return signatures
+
+
+def _unique_sorted(values):
+    # np.unique through a plain sort (numpy's hash-based unique is much slower on
+    # millions of distinct int64 values)
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]] if len(values) else values
+
+
+def _shared_counts(customer, gram, n_customers, n_grams, a, b):
+    # Number of n-grams each (a, b) pair has in common, plus the n-gram count of every
+    # customer: each n-gram of a is looked up among the sorted (customer, gram) keys of b.
+    # Pairs are processed in chunks to bound the size of the lookup arrays.
+    keys = customer * n_grams + gram
+    starts = np.searchsorted(customer, np.arange(n_customers + 1))
+    counts = np.diff(starts)
+    shared = np.zeros(len(a), dtype=np.int64)
+    for chunk_start in range(0, len(a), PAIR_CHUNK_SIZE):
+        chunk_a = a[chunk_start:chunk_start + PAIR_CHUNK_SIZE]
+        chunk_b = b[chunk_start:chunk_start + PAIR_CHUNK_SIZE]
+        lookups = counts[chunk_a]
+        pair_of_lookup = np.repeat(np.arange(len(chunk_a)), lookups)
+        lookup = np.repeat(starts[chunk_a] - np.cumsum(lookups) + lookups, lookups) + np.arange(len(pair_of_lookup))
+        query = chunk_b[pair_of_lookup] * n_grams + gram[lookup]
+        # Sorted lookups walk the keys in order, which is many times faster than random ones
+        order = np.argsort(query)
+        query = query[order]
+        found = keys[np.minimum(np.searchsorted(keys, query), len(keys) - 1)] == query
+        shared[chunk_start:chunk_start + len(chunk_a)] = np.bincount(pair_of_lookup[order], weights=found, minlength=len(chunk_a))
+    return shared, counts
+
+
+def find_near_duplicates(final_df, min_score=DEFAULT_MIN_SCORE, max_block_size=DEFAULT_MAX_BLOCK_SIZE,
+                         ngram_size=NGRAM_SIZE):
+    """Find customers with different numbers that are likely the same person.
+
+    Blocking: customers of the same expert (sp) whose name n-gram sets agree on one band
+    of MinHash values share a block (locality-sensitive hashing), so similar names meet
+    without comparing all pairs. Blocks larger than max_block_size are skipped, which
+    keeps the work near-linear in the number of customers.
+    Scoring: Jaccard similarity of the n-gram sets of the normalized names.
+    Returns the pairs with score >= min_score, best first.
+    """
+    valid = valid_name_mask(final_df['name']).to_numpy()
+    candidates = final_df[valid].reset_index(drop=True)
+    normalized = normalize_names(candidates['name'])
+    # Names without letters (e.g. only punctuation) have no n-grams to compare
+    candidates = candidates[(normalized.str.len() > 0).to_numpy()].reset_index(drop=True)
+    normalized = normalized[normalized.str.len() > 0]
+    n = len(candidates)
+    if n == 0:
+        return pd.DataFrame(columns=['numberr_1', 'name_1', 'numberr_2', 'name_2', 'sp', 'score'])
+
+    grams = name_ngrams(normalized.tolist(), ngram_size)
+    # Dense n-gram ids; sorted ids keep the rows sorted by customer then id
+    customer = grams['customer'].to_numpy()
+    gram = pd.factorize(grams['gram'], sort=True)[0].astype(np.int64)
+    n_grams = int(gram.max()) + 1
+
+    sp_codes = pd.factorize(candidates['sp'].astype(object), use_na_sentinel=False)[0].astype(np.int64)
+    signatures = _min_hashes(customer, gram, n, NUM_BANDS * ROWS_PER_BAND)
+
+    pair_codes = []
+    for band in range(NUM_BANDS):
+        band_rows = signatures[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        band_key = np.zeros(n, dtype=np.int64)
+        for row in band_rows:
+            band_key = pd.factorize(band_key * HASH_PRIME + row)[0].astype(np.int64)
+        block = pd.factorize(band_key * (sp_codes.max() + 1) + sp_codes)[0]
+        block_size = np.bincount(block)[block]
+        members = np.flatnonzero((block_size >= 2) & (block_size <= max_block_size))
+        members = members[np.argsort(block[members], kind='stable')]
+        a, b = _block_pairs(block[members], members)
+        pair_codes.append(a.astype(np.int64) * n + b)
+
+    pair_codes = _unique_sorted(np.concatenate(pair_codes))
+    a, b = pair_codes // n, pair_codes % n
+
+    # Cheap filters before the exact count: the similarity can't exceed the ratio of the
+    # n-gram counts, and the share of equal min-hashes estimates it
+    gram_counts = np.bincount(customer, minlength=n)
+    possible = np.minimum(gram_counts[a], gram_counts[b]) >= min_score * np.maximum(gram_counts[a], gram_counts[b])
+    a, b = a[possible], b[possible]
+    equal_hashes = np.zeros(len(a), dtype=np.int64)
+    for row in signatures:
+        equal_hashes += row[a] == row[b]
+    likely = equal_hashes >= (min_score - MINHASH_FILTER_MARGIN) * len(signatures)
+    a, b = a[likely], b[likely]
+
+    shared, _ = _shared_counts(customer, gram, n, n_grams, a, b)
+    scores = shared / (gram_counts[a] + gram_counts[b] - shared)
+    keep = scores >= min_score
+    a, b, scores = a[keep], b[keep], scores[keep]
+
+    pairs = pd.DataFrame({
+        'numberr_1': candidates['numberr'].to_numpy()[a],
+        'name_1': candidates['name'].to_numpy()[a],
+        'numberr_2': candidates['numberr'].to_numpy()[b],
+        'name_2': candidates['name'].to_numpy()[b],
+        'sp': candidates['sp'].to_numpy()[a],
+        'score': np.round(scores, 3),
+    })
+    return pairs.sort_values(['score', 'numberr_1', 'numberr_2'], ascending=[False, True, True], ignore_index=True)
+
+
+def write_review_sheet(pairs, path, output_format=None):
+    """Write likely duplicates for manual review, with an empty 'same_person' column to fill in"""
+    review = pairs.copy()
+    review['same_person'] = None
+    write_output(review, path, output_format)
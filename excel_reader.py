@@ -0,0 +1,210 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+from typing import Dict, List, Optional, Sequence
+
+# Number of rows converted to column arrays at a time
+DEFAULT_CHUNK_SIZE = 50000
+
+# Cell texts that pd.read_excel turns into NaN by default
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+
+def _convert_cell(value):
+    """Convert a raw openpyxl value the same way pd.read_excel does"""
+    if isinstance(value, str):
+        return None if value in NA_STRINGS else value
+    # Whole-number floats are read back as ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _header_names(header_row: Sequence) -> List:
+    """Build column names like pd.read_excel: unnamed and duplicated headers get suffixes"""
+    names = []
+    seen: Dict = {}
+    for i, value in enumerate(header_row):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _typed_column(values: List) -> pd.Series:
+    """Build a typed column, converting numeric text to numbers like pd.read_excel"""
+    column = pd.Series(values)
+    if column.dtype == object or pd.api.types.is_string_dtype(column):
+        # Dates and other non-text cells stay as they are
+        if not all(isinstance(value, (str, int, float)) for value in values if value is not None):
+            return column
+        numeric = pd.to_numeric(column, errors='coerce')
+        if numeric.notna().sum() == column.notna().sum():
+            return numeric
+    return column
+
+
+class _ChunkColumn:
+    """One chunk of a column, typed without losing what the whole column may need.
+
+    _typed_column decides over the whole column whether numeric text becomes numbers,
+    so a chunk keeps its text (as a compact str array) and only records whether it
+    could be converted. Ints with blanks are kept as nullable ints rather than floats
+    and int/float mixes as objects, so a column that turns out mixed gets its exact
+    values back. _join_chunks combines the chunks into what _typed_column would
+    return for the whole column.
+    """
+
+    def __init__(self, values: List):
+        column = pd.Series(values)
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+        if kind == 'integer' and column.dtype == np.float64:
+            column = pd.Series(pd.array(values, dtype='Int64'))
+        elif kind == 'mixed-integer-float':
+            column = pd.Series(values, dtype=object)
+        self.values = column
+        self.length = len(values)
+        self.has_na = bool(column.isna().any())
+        # The conditions _typed_column checks, for this chunk's values
+        self.text_like = all(isinstance(value, (str, int, float)) for value in values if value is not None)
+        self.numeric_ok = True
+        if self.text_like and (column.dtype == object or pd.api.types.is_string_dtype(column)):
+            self.numeric_ok = bool(pd.to_numeric(column, errors='coerce').notna().sum() == column.notna().sum())
+
+    @property
+    def kind(self) -> str:
+        dtype = self.values.dtype
+        if self.length == 0 or not self.values.notna().any():
+            return 'empty'
+        if pd.api.types.is_bool_dtype(dtype):
+            return 'bool'
+        if pd.api.types.is_integer_dtype(dtype):
+            return 'int'
+        if pd.api.types.is_float_dtype(dtype):
+            return 'float'
+        if pd.api.types.is_datetime64_dtype(dtype):
+            return 'datetime'
+        if pd.api.types.is_string_dtype(dtype) and dtype != object:
+            return 'str'
+        return 'object'
+
+    def as_objects(self) -> np.ndarray:
+        # The Python values pd.Series(values) keeps in an object column, None for blanks
+        values = self.values.to_numpy(dtype=object, na_value=None)
+        if self.kind == 'datetime':
+            values[:] = [None if value is None or value is pd.NaT else value.to_pydatetime() for value in values]
+        return values
+
+    def as_numbers(self) -> np.ndarray:
+        if self.kind == 'empty':
+            return np.full(self.length, np.nan)
+        numeric = pd.to_numeric(self.values, errors='coerce')
+        if pd.api.types.is_bool_dtype(numeric.dtype):
+            # In an object column with other values, True and False become 1 and 0
+            numeric = numeric.astype(np.int64)
+        if numeric.isna().any():
+            return numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+        return numeric.to_numpy()
+
+
+def _join_chunks(chunks: List[_ChunkColumn]) -> pd.Series:
+    """The column _typed_column would build from the values of all chunks together"""
+    if sum(chunk.length for chunk in chunks) == 0:
+        return _typed_column([])
+    kinds = {chunk.kind for chunk in chunks} - {'empty'}
+    has_na = any(chunk.has_na or chunk.kind == 'empty' for chunk in chunks)
+
+    # pd.Series(values) of the whole column: one dtype if every chunk agrees on it
+    if kinds == {'int'} and not has_na:
+        return pd.Series(np.concatenate([chunk.values.to_numpy(dtype=np.int64) for chunk in chunks]))
+    if kinds and kinds <= {'int', 'float'}:
+        return pd.Series(np.concatenate([chunk.as_numbers() for chunk in chunks]))
+    if kinds == {'bool'} and not has_na:
+        return pd.Series(np.concatenate([chunk.values.to_numpy(dtype=bool) for chunk in chunks]))
+    if kinds == {'datetime'}:
+        parts = [chunk.values if chunk.kind != 'empty' else pd.Series(pd.NaT, index=range(chunk.length), dtype='datetime64[us]')
+                 for chunk in chunks]
+        return pd.concat(parts, ignore_index=True)
+
+    # Text or mixed: the numbers when every value converts, as _typed_column does
+    if all(chunk.text_like and chunk.numeric_ok for chunk in chunks):
+        parts = [chunk.as_numbers() for chunk in chunks]
+        if all(part.dtype == parts[0].dtype for part in parts):
+            return pd.Series(np.concatenate(parts))
+        return pd.Series(np.concatenate([part.astype(np.float64) for part in parts]))
+    if kinds == {'str'}:
+        parts = [chunk.values if chunk.kind != 'empty' else pd.Series([None] * chunk.length, dtype='str')
+                 for chunk in chunks]
+        return pd.concat(parts, ignore_index=True)
+    return pd.Series(np.concatenate([chunk.as_objects() for chunk in chunks]), dtype=object)
+
+
+def _chunk_to_columns(rows: List[tuple], positions: List[int]) -> List[_ChunkColumn]:
+    """Turn a chunk of row tuples into one typed chunk per projected column"""
+    return [
+        _ChunkColumn([_convert_cell(row[pos]) if pos < len(row) else None for row in rows])
+        for pos in positions
+    ]
+
+
+def read_excel_streaming(file_path: str, columns: Optional[Sequence] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> pd.DataFrame:
+    """Read the first sheet of a workbook row by row with bounded memory.
+
+    Uses openpyxl's read-only mode, keeps only the requested columns (all columns
+    when None; requested columns missing from the sheet are skipped) and converts
+    rows to typed column arrays every chunk_size rows, so only one chunk of raw
+    rows is alive at a time. Whether numeric text becomes numbers is still decided
+    over the whole column (see _ChunkColumn), so chunk_size only affects memory.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return pd.DataFrame(columns=list(columns) if columns is not None else [])
+
+        names = _header_names(header_row)
+        if columns is None:
+            positions = list(range(len(names)))
+        else:
+            wanted = set(columns)
+            positions = [i for i, name in enumerate(names) if name in wanted]
+        selected_names = [names[i] for i in positions]
+
+        chunks: List[List[_ChunkColumn]] = []
+        pending: List[tuple] = []
+        blank_rows = 0
+        for row in rows:
+            # Blank rows are kept as empty rows, except trailing ones (as pd.read_excel does)
+            if all(value is None for value in row):
+                blank_rows += 1
+                continue
+            if blank_rows:
+                pending.extend([()] * blank_rows)
+                blank_rows = 0
+            pending.append(row)
+            if len(pending) >= chunk_size:
+                chunks.append(_chunk_to_columns(pending, positions))
+                pending = []
+        if pending or not chunks:
+            chunks.append(_chunk_to_columns(pending, positions))
+    finally:
+        workbook.close()
+
+    data = {}
+    for i, name in enumerate(selected_names):
+        parts = [chunk[i] for chunk in chunks]
+        # Drop references to the per-chunk arrays as soon as the column is built
+        for chunk in chunks:
+            chunk[i] = None
+        data[name] = _join_chunks(parts)
+        del parts
+    return pd.DataFrame(data, columns=selected_names)
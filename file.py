@@ -1,8 +1,88 @@
+import argparse
+import csv
+import numpy as np
 import pandas as pd
 import re
+import sqlite3
+from contextlib import nullcontext
+from customer_store import CustomerStore
+from database import Database
+from excel_reader import DEFAULT_CHUNK_SIZE
+from input_files import expand_input_paths, read_input_files
+from parse_cache import HAS_PYARROW
+from profiler import StageProfiler
 
 target_sales_experts = ['بابایی', 'احمدی', 'هارونی', 'محمدی']
 
+product_cols = ['chini', 'dakheli', 'zaban', 'book', 'device', 'azmoon', 'ghabooli', 'garage', 'hoz', 'kia', 'milyarder', 'gds-tuts','gds','tpms-tuts','zed', 'kmc', 'carmap', 'escl']
+
+aggregation_logic = {
+    'name': 'first',
+    'sp': 'first',
+    'chini': 'max',
+    'dakheli': 'max',
+    'zaban': 'max',
+    'book': 'max',
+    'device': 'max',
+    'azmoon': 'max',
+    'ghabooli': 'max',
+    'garage': 'max',
+    'hoz': 'max',
+    'kia': 'max',
+    'milyarder': 'max',
+    'gds-tuts': 'max',
+    'gds': 'max',
+    'tpms-tuts': 'max',
+    'zed': 'max',
+    'kmc': 'max',
+    'carmap': 'max',
+    'escl': 'max',
+    # 'maps': 'max',
+    'hichi': 'max',
+}
+
+# Build human-readable products list based on purchased product flags
+product_name_map = {
+	'chini': 'دوره آنلاین چینی',
+	'dakheli': 'دوره آنلاین داخلی',
+	'zaban': 'دوره زبان فنی',
+	'book': 'کتاب زبان فنی',
+	'device': 'تجهیزات',
+	'hoz': 'دوره حضوری',
+	'kia': 'دوره آنلاین کره ای',
+	'milyarder': 'دوره تعمیرکار میلیاردر',
+	'gds-tuts': 'دوره GDS',
+    'gds': 'نرم افزار GDS',
+	'tpms-tuts': 'دوره TPMS',
+	'zed': 'دوره ضد سرقت',
+	'kmc': 'وبینار KMC',
+	'carmap': 'کارمپ',
+	'escl': 'فرمان برقی حضوری',
+}
+
+# Columns every input list must have
+required_cols = ['numberr', 'name', 'sp']
+# Columns the merge reads from the input list, everything else is skipped while reading
+merge_input_cols = required_cols + product_cols + ['hichi', 'description']
+
+DEFAULT_INPUT_PATH = 'list.xlsx'
+DEFAULT_OUTPUT_PATH = 'final_merged_list.xlsx'
+
+# Defaults used by merge_customers; pass a dict with any of these keys to override them
+DEFAULT_MERGE_CONFIG = {
+    'product_cols': product_cols,
+    'product_name_map': product_name_map,
+    'target_sales_experts': target_sales_experts,
+    # Print progress messages while merging
+    'verbose': True,
+    # Longest merged description kept per customer (characters); None keeps all of it
+    'max_description_length': None,
+    # Keep names and descriptions as Arrow strings during the merge (needs pyarrow)
+    'arrow_strings': False,
+    # StageProfiler recording time, CPU, peak memory and row counts of each stage
+    'profiler': None,
+}
+
 def clean_phone_number(phone_value):
     # Normalize phone numbers: return 10 digits starting with 9 (remove leading 0 if exists)
     # Iranian mobile numbers must start with 9
@@ -55,6 +135,40 @@ def clean_phone_number(phone_value):
     
     return None
 
+def _phone_digit_strings(series):
+    # Split a column into the digit-only strings used by the vectorized phone helpers.
+    # str.isdigit also accepts non-ASCII digits (e.g. Persian), which the regex path
+    # does not handle the same way, so those rare values are flagged separately
+    # and go through the scalar functions instead.
+    present_pos = np.flatnonzero(series.notna().to_numpy())
+    text = series.iloc[present_pos].astype(str)
+    non_ascii = ~text.map(str.isascii).to_numpy(dtype=bool)
+    digits = text[~non_ascii].str.replace(r'\D', '', regex=True)
+    return present_pos, text, non_ascii, digits
+
+def _leftmost_mobile_window(digits):
+    # The scalar loops return the first 10-digit window starting with 9. Such a window
+    # exists only if the first 9 is followed by at least 9 more digits, so the window is
+    # the first 10 characters after stripping everything before the first 9.
+    from_first_9 = digits.str.lstrip('012345678')
+    return from_first_9.str[:10].where(from_first_9.str.len() >= 10)
+
+def clean_phone_numbers(series):
+    # Column-at-a-time version of clean_phone_number, returns exactly the same values
+    present_pos, text, non_ascii, digits = _phone_digit_strings(series)
+    # Numbers longer than 11 digits prefer the last 10 digits when they start with 9,
+    # otherwise the leftmost 10-digit window starting with 9 is used (as in the scalar loops)
+    last_10 = digits.str[-10:]
+    use_last = (digits.str.len() > 11) & last_10.str.startswith('9')
+    cleaned = last_10.where(use_last, _leftmost_mobile_window(digits))
+
+    values = np.full(len(series), None, dtype=object)
+    values[present_pos[~non_ascii]] = cleaned.to_numpy(dtype=object, na_value=None)
+    if non_ascii.any():
+        raw = series.to_numpy(dtype=object)[present_pos[non_ascii]]
+        values[present_pos[non_ascii]] = [clean_phone_number(value) for value in raw]
+    return pd.Series(values, index=series.index, name=series.name, dtype=object)
+
 def agg_description(series):
     non_null_series = series.dropna()
     if non_null_series.empty:
@@ -62,25 +176,50 @@ def agg_description(series):
     # Concatenate all descriptions with a separator
     return ' | '.join(non_null_series.astype(str))
 
-try:
-    df = pd.read_excel('list.xlsx')
-except FileNotFoundError:
-    print("Excel file not found. Please check the file name.")
-    exit()
-
-print("Cleaning and standardizing phone numbers...")
-df['numberr'] = df['numberr'].apply(clean_phone_number)
-print("Phone number cleaning completed.")
-df.dropna(subset=['numberr'], inplace=True)
-df['__original_order'] = df.index
-
-product_cols = ['chini', 'dakheli', 'zaban', 'book', 'device', 'azmoon', 'ghabooli', 'garage', 'hoz', 'kia', 'milyarder', 'gds-tuts','gds','tpms-tuts','zed', 'kmc', 'carmap', 'escl']
-
-# Normalize product columns to 0/1 before aggregation to ensure proper merging
-for col in product_cols:
-    if col in df.columns:
-        numeric_col = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        df[col] = (numeric_col > 0).astype(int)
+def join_descriptions(keys, descriptions, n_keys, max_length=None):
+    # agg_description for all numbers at once. The non-null descriptions are sorted by key
+    # (stable, so each number keeps its row order), written into one big string with ' | '
+    # between the rows of a number, and each number's text is sliced out by its offsets.
+    # Returns an object array indexed by key, None for numbers without a description.
+    values = descriptions.to_numpy(dtype=object)
+    present = pd.notna(values)
+    keys = keys[present]
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    texts = np.array([value if isinstance(value, str) else str(value) for value in values[present][order]], dtype=object)
+
+    group_start = np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+    group_end = np.r_[group_start[1:], True] if len(keys) else group_start
+    separators = np.where(group_end, '', ' | ').astype(object)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)) + np.where(group_end, 0, 3)
+    if max_length is not None:
+        # Cut each number's pieces at max_length characters from its start before joining,
+        # so text beyond the cap never gets copied into the big string
+        piece_start = np.cumsum(lengths) - lengths
+        group_offset = piece_start - piece_start[group_start][np.cumsum(group_start) - 1]
+        kept = np.clip(max_length - group_offset, 0, lengths)
+        whole = kept == lengths
+        cut = np.flatnonzero(~whole)
+        pieces = np.empty(len(texts), dtype=object)
+        pieces[whole] = texts[whole] + separators[whole]
+        pieces[cut] = [(texts[i][:keep] + separators[i])[:keep] for i, keep in zip(cut.tolist(), kept[cut].tolist())]
+        lengths = kept
+    else:
+        pieces = texts + separators
+    ends = np.cumsum(lengths)
+    joined = ''.join(pieces)
+
+    char_start = (ends - lengths)[group_start]
+    char_end = ends[group_end]
+    result = np.full(n_keys, None, dtype=object)
+    result[keys[group_start]] = [joined[start:end] for start, end in zip(char_start.tolist(), char_end.tolist())]
+    return result
+
+# Common "no name" patterns; a name containing any of them (case-insensitive) is invalid
+invalid_name_patterns = ['بدون نام', 'بدوننام', 'نام ندارد', 'نام ندارد', 'nan', 'None', 'null']
+
+# All is_valid_name rejections in one regex over the lowercased name: a pattern or a digit
+invalid_name_regex = re.compile('|'.join(re.escape(pattern.lower()) for pattern in invalid_name_patterns) + r'|\d')
 
 # Helper function to check if a name is valid (not empty, not "بدون نام", not NaN, and no digits)
 def is_valid_name(name):
@@ -90,9 +229,8 @@ def is_valid_name(name):
     if not name_str or name_str == '':
         return False
     # Check for common "no name" patterns
-    invalid_patterns = ['بدون نام', 'بدوننام', 'نام ندارد', 'نام ندارد', 'nan', 'None', 'null']
     name_lower = name_str.lower()
-    for pattern in invalid_patterns:
+    for pattern in invalid_name_patterns:
         if pattern.lower() in name_lower:
             return False
     # Check if name contains digits - if it does, it's not valid
@@ -100,163 +238,138 @@ def is_valid_name(name):
         return False
     return True
 
-# Compute preferred name per number: 
-# 1. Prefer valid names (not empty, not "بدون نام", no digits)
-# 2. Then prefer earliest appearance
-df['__is_valid_name'] = df['name'].apply(is_valid_name)
-
-# Create name preference map
-name_pref_map = (
-    df.sort_values(['numberr', '__is_valid_name', '__original_order'], 
-                   ascending=[True, False, True])
-      .drop_duplicates('numberr', keep='first')
-      .set_index('numberr')['name']
-)
-
-# For numbers that still have invalid names, try to find any valid name from other rows with same number
-def get_best_name_for_number(number, df_subset):
-    # Get all names for this number
-    names = df_subset[df_subset['numberr'] == number]['name'].dropna()
-    valid_names = [name for name in names if is_valid_name(name)]
-    
-    # Since is_valid_name already checks for digits, all valid_names are without digits
-    if valid_names:
-        return valid_names[0]
-    return None
-
-# Update name_pref_map for numbers with invalid names
-for number in name_pref_map.index:
-    current_name = name_pref_map[number]
-    if not is_valid_name(current_name):
-        # Try to find a valid name from all rows with this number
-        better_name = get_best_name_for_number(number, df)
-        if better_name and is_valid_name(better_name):
-            name_pref_map[number] = better_name
-
-aggregation_logic = {
-    'name': 'first',
-    'sp': 'first',
-    'chini': 'max',
-    'dakheli': 'max',
-    'zaban': 'max',
-    'book': 'max',
-    'device': 'max',
-    'azmoon': 'max',
-    'ghabooli': 'max',
-    'garage': 'max',
-    'hoz': 'max',
-    'kia': 'max',
-    'milyarder': 'max',
-    'gds-tuts': 'max',
-    'gds': 'max',
-    'tpms-tuts': 'max',
-    'zed': 'max',
-    'kmc': 'max',
-    'carmap': 'max',
-    'escl': 'max',
-    # 'maps': 'max',
-    'hichi': 'max',
-}
-
-# Add description column to aggregation logic if it exists in the dataframe
-if 'description' in df.columns:
-    aggregation_logic['description'] = agg_description
-
-final_df = df.groupby('numberr').agg(aggregation_logic).reset_index()
-
-# Restore original order based on first appearance in input
-order_map = df.drop_duplicates('numberr')[['numberr', '__original_order']]
-final_df = final_df.merge(order_map, on='numberr', how='left').sort_values('__original_order').drop(columns='__original_order')
-
-# Ensure sp for each number equals sp from the first occurrence in the original list
-first_sp_map = (
-    df.sort_values('__original_order')
-      .drop_duplicates('numberr', keep='first')
-      .set_index('numberr')['sp']
-)
-final_df['sp'] = final_df['numberr'].map(first_sp_map)
-
-# Ensure name uses the preferred mapping (no digits if available)
-final_df['name'] = final_df['numberr'].map(name_pref_map)
-
-# Final check: if any name is still invalid, try to find from original dataframe
-print("Filling missing or invalid names from other rows with same number...")
-def fill_missing_names(row):
-    name = row['name']
-    number = row['numberr']
-    
-    # If name is invalid, search in original dataframe
-    if not is_valid_name(name):
-        # Get all rows with same number from original dataframe
-        same_number_rows = df[df['numberr'] == number]
-        valid_names = same_number_rows['name'].apply(is_valid_name)
-        valid_name_rows = same_number_rows[valid_names]
-        
-        if not valid_name_rows.empty:
-            # Since is_valid_name already checks for digits, all valid_name_rows are without digits
-            return valid_name_rows.iloc[0]['name']
-    
-    return name
-
-# Count invalid names before filling
-invalid_before = final_df['name'].apply(lambda x: not is_valid_name(x)).sum()
-final_df['name'] = final_df.apply(fill_missing_names, axis=1)
-# Count invalid names after filling
-invalid_after = final_df['name'].apply(lambda x: not is_valid_name(x)).sum()
-filled_count = invalid_before - invalid_after
-
-if filled_count > 0:
-    print(f"Filled {filled_count} missing/invalid names from other rows with same number.")
-else:
-    print("All names are valid or no replacements found.")
-
-print("Updating 'hichi' column based on new logic...")
-# Only use product columns that actually exist in final_df
-available_product_cols = [col for col in product_cols if col in final_df.columns]
-if available_product_cols:
-    final_df['hichi'] = (final_df[available_product_cols].fillna(0).sum(axis=1) == 0).astype(int)
-else:
-    # If no product columns available, set all to 0 (no products)
-    final_df['hichi'] = 0
-print("'hichi' column calculation completed.")
-
-# Build human-readable products list based on purchased product flags
-product_name_map = {
-	'chini': 'دوره آنلاین چینی',
-	'dakheli': 'دوره آنلاین داخلی',
-	'zaban': 'دوره زبان فنی',
-	'book': 'کتاب زبان فنی',
-	'device': 'تجهیزات',
-	'hoz': 'دوره حضوری',
-	'kia': 'دوره آنلاین کره ای',
-	'milyarder': 'دوره تعمیرکار میلیاردر',
-	'gds-tuts': 'دوره GDS',
-    'gds': 'نرم افزار GDS',
-	'tpms-tuts': 'دوره TPMS',
-	'zed': 'دوره ضد سرقت',
-	'kmc': 'وبینار KMC',
-	'carmap': 'کارمپ',
-	'escl': 'فرمان برقی حضوری',
-}
-
-def build_products_cell(row):
-	selected = []
-	for col, pname in product_name_map.items():
-		if col in row and pd.notna(row[col]) and int(row[col]) == 1:
-			selected.append(pname)
-	return ' | '.join(selected)
-
-final_df['products'] = final_df.apply(build_products_cell, axis=1)
-
-# Ensure 'products' is the last column
-cols_order = list(final_df.columns)
-if 'products' in cols_order:
-	cols_order = [c for c in cols_order if c != 'products'] + ['products']
-	final_df = final_df[cols_order]
-
-# Keep product columns in output for matrix formation (do not drop them)
-# columns_to_drop = [col for col in product_cols if col in final_df.columns]
-# final_df = final_df.drop(columns=columns_to_drop)
+def _valid_name_texts(texts):
+    # is_valid_name for an object array of str. The Series stays object dtype so .str uses
+    # Python's lower() and Unicode \d like is_valid_name (Arrow strings follow other rules).
+    lowered = pd.Series(texts, dtype=object).str.strip().str.lower()
+    return ((lowered.str.len() > 0) & ~lowered.str.contains(invalid_name_regex)).to_numpy(dtype=bool)
+
+def valid_name_mask(series):
+    # Vectorized is_valid_name over a column, as a bool Series with the same index.
+    # Names repeat a lot across duplicate rows, so each distinct text is checked once.
+    if isinstance(series.dtype, pd.StringDtype):
+        # Only text and NA: factorize in place instead of building a Python str per row
+        codes, unique_texts = pd.factorize(series)
+        valid_texts = _valid_name_texts(np.asarray(unique_texts, dtype=object))
+        mask = np.zeros(len(series), dtype=bool)
+        present = codes >= 0
+        mask[present] = valid_texts[codes[present]]
+        return pd.Series(mask, index=series.index, name=series.name)
+
+    values = series.to_numpy(dtype=object)
+    is_text = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+    mask = np.zeros(len(values), dtype=bool)
+    codes, unique_texts = pd.factorize(values[is_text])
+    mask[is_text] = _valid_name_texts(np.asarray(unique_texts, dtype=object))[codes]
+    # Missing values, numbers and dates are checked one by one; factorize would treat
+    # e.g. 1, 1.0 and True as the same value although their texts differ
+    other = np.flatnonzero(~is_text)
+    mask[other] = [is_valid_name(values[i]) for i in other]
+    return pd.Series(mask, index=series.index, name=series.name)
+
+def group_numbers(df):
+    # Index every number of the prepared rows with one stable sort by __number_key.
+    # Keys are numbered in order of first appearance, so group i is the i-th new number and
+    # rows keep their input order inside each group. Returns, per number (in key order):
+    # - first_row: position of its first row
+    # - sp_row: position of its row with the smallest __original_order (same as first_row
+    #   unless the index is out of order)
+    # - valid_name_row: position of its row with a valid name and the smallest
+    #   __original_order, -1 if there is none
+    # - flags: OR of the product flags of all its rows
+    keys = df['__number_key'].to_numpy()
+    order = np.argsort(keys, kind='stable')
+    counts = np.bincount(keys)
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    first_row = order[starts]
+
+    # Rows of each group by __original_order; the same as order unless the index is out of order
+    original_order = df['__original_order'].to_numpy()
+    if np.all(original_order[1:] >= original_order[:-1]):
+        by_original = order
+    else:
+        by_original = np.lexsort((original_order, keys))
+    sp_row = by_original[starts]
+
+    # First sorted position holding a valid name in each group; n marks "none"
+    n = len(keys)
+    valid_positions = np.where(df['__is_valid_name'].to_numpy()[by_original], np.arange(n), n)
+    first_valid = np.minimum.reduceat(valid_positions, starts) if n else valid_positions
+    valid_name_row = np.where(first_valid < n, by_original[np.minimum(first_valid, n - 1)], -1)
+
+    flags = df['__flags'].to_numpy()[order]
+    flags = np.bitwise_or.reduceat(flags, starts) if n else flags
+
+    return pd.DataFrame({
+        'first_row': first_row,
+        'sp_row': sp_row,
+        'valid_name_row': valid_name_row,
+        'flags': flags,
+    })
+
+def _take_rows(series, positions):
+    # Values of series at row positions, with a fresh RangeIndex
+    return series.iloc[positions].reset_index(drop=True)
+
+def flag_dtype(product_cols):
+    # Smallest unsigned integer type that holds one bit per product column
+    if len(product_cols) <= 32:
+        return np.uint32
+    if len(product_cols) <= 64:
+        return np.uint64
+    raise ValueError("At most 64 product columns can be packed into the product flags")
+
+def pack_product_flags(df, product_cols):
+    # Pack the 0/1 product columns of each row into one bitmask, bit i = product_cols[i].
+    # Values greater than 0 count as purchased, anything else (text, NaN, 0) as not.
+    dtype = flag_dtype(product_cols)
+    flags = np.zeros(len(df), dtype=dtype)
+    for bit, col in enumerate(product_cols):
+        if col in df.columns:
+            numeric_col = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            flags |= (numeric_col.to_numpy() > 0).astype(dtype) << dtype(bit)
+    return flags
+
+def build_products_and_hichi(flags, present_product_cols, product_cols, product_name_map):
+    # Build the products labels and the hichi flags from the packed product flags in one pass.
+    # The label of every distinct combination of labeled products is joined once and mapped
+    # back to the rows instead of looping per row.
+    bits = {col: product_cols.index(col) for col in present_product_cols}
+    if bits:
+        available_mask = sum(1 << bit for bit in bits.values())
+        hichi = (flags & available_mask) == 0
+    else:
+        # If no product columns available, set all to 0 (no products)
+        hichi = np.zeros(len(flags), dtype=bool)
+
+    labeled_cols = [col for col in product_name_map if col in bits]
+    labeled_mask = sum(1 << bits[col] for col in labeled_cols)
+    unique_codes, row_codes = np.unique(flags & labeled_mask, return_inverse=True)
+    labels = np.array([
+        ' | '.join(product_name_map[col] for col in labeled_cols if int(code) >> bits[col] & 1)
+        for code in unique_codes
+    ], dtype=object)
+    return labels[row_codes.reshape(-1)], hichi
+
+def expand_product_flags(final_df, flags, input_cols, product_cols):
+    # Expand the packed product flags back into the per-column layout of the output file.
+    # Purchased products are 1 and everything else is left empty.
+    output_df = final_df[['numberr']].copy()
+    for col in aggregation_logic:
+        if col not in input_cols:
+            continue
+        if col in product_cols:
+            purchased = (flags >> product_cols.index(col)) & 1
+            output_df[col] = np.where(purchased == 1, 1, None)
+        elif col in final_df.columns:
+            output_df[col] = final_df[col]
+        else:
+            # Placeholder that keeps the input's column position, filled in by finalize_customers
+            output_df[col] = None
+    if 'description' in final_df.columns:
+        output_df['description'] = final_df['description']
+    return output_df
 
 # Ensure phone numbers are in 10-digit format (starting with 9) in output
 def format_phone_10_digits(phone):
@@ -278,29 +391,466 @@ def format_phone_10_digits(phone):
                 return candidate
     return phone_str
 
-final_df['numberr'] = final_df['numberr'].apply(format_phone_10_digits)
-
-# Convert 0 values to empty (NaN) in product columns and hichi - only keep 1 values
-for col in product_cols:
-    if col in final_df.columns:
-        final_df[col] = final_df[col].replace(0, None)
-
-# Convert 0 to empty in hichi column as well
-if 'hichi' in final_df.columns:
-    final_df['hichi'] = final_df['hichi'].replace(0, None)
-
-final_df.to_excel('final_merged_list.xlsx', index=False)
-print("\n'final_merged_list.xlsx' successfully created!")
-
-# Print distribution statistics
-print("\n=== Distribution of customers among sales experts ===")
-total_customers = len(final_df)
-for expert in target_sales_experts:
-    count = (final_df['sp'] == expert).sum()
-    percentage = (count / total_customers * 100) if total_customers > 0 else 0
-    print(f"{expert}: {count} customer ({percentage:.1f}%)")
-
-print(f"\nTotal customers: {total_customers}")
-print("Processing completed successfully!")
-
-input("\nPress Enter to close the window...")
+def format_phones_10_digits(series):
+    # Column-at-a-time version of format_phone_10_digits, returns exactly the same values
+    present_pos, text, non_ascii, digits = _phone_digit_strings(series)
+    # The 11-digit "09..." and 10-digit "9..." cases are both the first window starting with 9
+    formatted = _leftmost_mobile_window(digits)
+    formatted = formatted.where(formatted.notna(), text[~non_ascii])
+
+    values = series.to_numpy(dtype=object).copy()
+    values[present_pos[~non_ascii]] = formatted.to_numpy(dtype=object)
+    if non_ascii.any():
+        raw = values[present_pos[non_ascii]]
+        values[present_pos[non_ascii]] = [format_phone_10_digits(value) for value in raw]
+    return pd.Series(values, index=series.index, name=series.name, dtype=object)
+
+def _resolve_config(config):
+    resolved = dict(DEFAULT_MERGE_CONFIG)
+    if config:
+        resolved.update(config)
+    return resolved
+
+def _progress(config, message):
+    if config['verbose']:
+        print(message)
+
+def _stage(config, name, rows_in=None):
+    # Profile a stage when a profiler is configured; set record['rows_out'] inside the block
+    if config['profiler'] is None:
+        return nullcontext({})
+    return config['profiler'].stage(name, rows_in)
+
+def prepare_rows(df, config):
+    # Clean phone numbers, drop rows without a valid mobile number and pack product flags.
+    # Works on a copy so the caller's DataFrame is left untouched. Also returns the merge
+    # columns present in the input, which decide the output layout.
+    missing_cols = [col for col in required_cols if col not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Missing required columns: {', '.join(missing_cols)}")
+    # Pack the product columns into one bitmask per row before aggregation; the separate
+    # columns are only expanded again when the output is built. hichi is always recomputed
+    # from the product flags, so only its position in the input is kept.
+    input_cols = [col for col in required_cols + config['product_cols'] + ['hichi', 'description'] if col in df.columns]
+    flags = pack_product_flags(df, config['product_cols'])
+    # Only the text columns are copied; other input columns are not part of the output
+    df = df[[col for col in required_cols + ['description'] if col in df.columns]].copy()
+    df['__flags'] = flags
+
+    _progress(config, "Cleaning and standardizing phone numbers...")
+    with _stage(config, 'clean_phone_numbers', len(df)) as record:
+        df['numberr'] = clean_phone_numbers(df['numberr'])
+        record['rows_out'] = int(df['numberr'].notna().sum())
+    _progress(config, "Phone number cleaning completed.")
+    df.dropna(subset=['numberr'], inplace=True)
+    df['__original_order'] = df.index
+
+    # Compute preferred name per number:
+    # 1. Prefer valid names (not empty, not "بدون نام", no digits)
+    # 2. Then prefer earliest appearance
+    # The mask is computed once here and reused by the aggregation and the customer store
+    with _stage(config, 'valid_name_mask', len(df)) as record:
+        df['__is_valid_name'] = valid_name_mask(df['name'])
+        record['rows_out'] = int(df['__is_valid_name'].sum())
+    return apply_dtype_plan(df, config), input_cols
+
+def apply_dtype_plan(df, config):
+    # Compact dtypes for the prepared rows, so the sorts, dedups and groupbys of the merge
+    # work on small keys instead of Python strings:
+    # - __number_key: int64 code of the cleaned number, numbered in order of first appearance.
+    #   A factorized code rather than int(numberr): cleaned numbers can hold non-ASCII digits,
+    #   which int() would silently turn into another number.
+    # - sp: categorical, as there are only a handful of experts
+    # - name/description: Arrow strings when config['arrow_strings'] is set (text-only columns)
+    # Product flags are already packed into one unsigned integer per row (__flags).
+    df['__number_key'] = pd.factorize(df['numberr'])[0].astype(np.int64)
+    df['sp'] = df['sp'].astype('category')
+    if config['arrow_strings'] and HAS_PYARROW:
+        for col in ['name', 'description']:
+            if col in df.columns and pd.api.types.infer_dtype(df[col], skipna=True) == 'string':
+                df[col] = df[col].astype('string[pyarrow]')
+    return df
+
+def restore_output_dtypes(final_df):
+    # Turn the compact merge dtypes back into the plain object columns of the output
+    for col in ['name', 'sp', 'description']:
+        if col in final_df.columns and final_df[col].dtype != object:
+            values = final_df[col].astype(object)
+            final_df[col] = values.where(values.notna(), None)
+    return final_df
+
+def aggregate_customers(df, config):
+    # Merge prepared rows into one row per number, in order of first appearance
+    with _stage(config, 'group_numbers', len(df)) as record:
+        groups = group_numbers(df)
+        record['rows_out'] = len(groups)
+
+    # Restore original order based on first appearance in input
+    first_rows = groups['first_row'].to_numpy()
+    customer_order = np.argsort(df['__original_order'].to_numpy()[first_rows], kind='stable')
+    groups = groups.iloc[customer_order].reset_index(drop=True)
+
+    final_df = pd.DataFrame({'numberr': _take_rows(df['numberr'], groups['first_row']).astype(object)})
+
+    # Name: the first valid name of the number (not empty, not "بدون نام", no digits),
+    # otherwise its first name, both by __original_order
+    has_valid_name = groups['valid_name_row'].to_numpy() >= 0
+    name_rows = np.where(has_valid_name, groups['valid_name_row'], groups['sp_row'])
+    final_df['name'] = _take_rows(df['name'], name_rows)
+
+    # Ensure sp for each number equals sp from the first occurrence in the original list
+    final_df['sp'] = _take_rows(df['sp'], groups['sp_row'])
+
+    # Add description column if it exists in the dataframe
+    if 'description' in df.columns:
+        with _stage(config, 'join_descriptions', len(df)) as record:
+            descriptions = join_descriptions(df['__number_key'].to_numpy(), df['description'], len(groups), config['max_description_length'])
+            final_df['description'] = descriptions[customer_order]
+            record['rows_out'] = len(final_df)
+
+    final_df['__flags'] = groups['flags'].to_numpy()
+
+    # Names taken from a later row because the number's first row has an invalid name
+    first_name_valid = df['__is_valid_name'].to_numpy()[groups['sp_row'].to_numpy()]
+    filled_count = int((has_valid_name & ~first_name_valid).sum())
+    _report_filled_names(config, filled_count)
+    return final_df, filled_count
+
+def _report_filled_names(config, filled_count):
+    if filled_count > 0:
+        _progress(config, f"Filled {filled_count} missing/invalid names from other rows with same number.")
+    else:
+        _progress(config, "All names are valid or no replacements found.")
+
+def finalize_customers(final_df, input_cols, config):
+    # Compute hichi and products and convert the merged rows to the output layout
+    _progress(config, "Updating 'hichi' column based on new logic...")
+    flags = final_df['__flags'].to_numpy()
+    present_product_cols = [col for col in config['product_cols'] if col in input_cols]
+    with _stage(config, 'build_products_and_hichi', len(final_df)) as record:
+        products, hichi = build_products_and_hichi(flags, present_product_cols, config['product_cols'], config['product_name_map'])
+        record['rows_out'] = len(products)
+    final_df = restore_output_dtypes(expand_product_flags(final_df, flags, input_cols, config['product_cols']))
+    final_df['hichi'] = hichi.astype(int)
+    _progress(config, "'hichi' column calculation completed.")
+
+    final_df['products'] = products
+
+    # Ensure 'products' is the last column
+    cols_order = list(final_df.columns)
+    if 'products' in cols_order:
+        cols_order = [c for c in cols_order if c != 'products'] + ['products']
+        final_df = final_df[cols_order]
+
+    # Keep product columns in output for matrix formation (do not drop them)
+    # columns_to_drop = [col for col in product_cols if col in final_df.columns]
+    # final_df = final_df.drop(columns=columns_to_drop)
+
+    # Ensure phone numbers are in 10-digit format (starting with 9) in output
+    with _stage(config, 'format_phones_10_digits', len(final_df)) as record:
+        final_df['numberr'] = format_phones_10_digits(final_df['numberr'])
+        record['rows_out'] = len(final_df)
+
+    # Product columns already hold only 1 values; convert 0 to empty in hichi column as well
+    if 'hichi' in final_df.columns:
+        final_df['hichi'] = final_df['hichi'].replace(0, None)
+    return final_df
+
+def expert_distribution(final_df, experts):
+    # Number and share of customers assigned to each sales expert
+    total_customers = len(final_df)
+    distribution = {}
+    for expert in experts:
+        count = int((final_df['sp'] == expert).sum())
+        percentage = (count / total_customers * 100) if total_customers > 0 else 0
+        distribution[expert] = {'count': count, 'percentage': percentage}
+    return distribution
+
+def merge_customers(df, config=None):
+    """Merge duplicate customers of an in-memory list into one row per phone number.
+
+    Returns the merged DataFrame in the final_merged_list.xlsx layout and a dict of
+    statistics. The input DataFrame is not modified, so the function can be called
+    repeatedly (e.g. from the GUI) without re-reading the file.
+    """
+    config = _resolve_config(config)
+    with _stage(config, 'prepare_rows', len(df)) as record:
+        rows, input_cols = prepare_rows(df, config)
+        record['rows_out'] = len(rows)
+    with _stage(config, 'aggregate_customers', len(rows)) as record:
+        final_df, filled_count = aggregate_customers(rows, config)
+        record['rows_out'] = len(final_df)
+    with _stage(config, 'finalize_customers', len(final_df)) as record:
+        final_df = finalize_customers(final_df, input_cols, config)
+        record['rows_out'] = len(final_df)
+
+    stats = {
+        'input_rows': len(df),
+        'valid_phone_rows': len(rows),
+        'total_customers': len(final_df),
+        'filled_names': filled_count,
+        'expert_distribution': expert_distribution(final_df, config['target_sales_experts']),
+    }
+    return final_df, stats
+
+def _as_sql_values(series):
+    # Python objects with None for missing values, as sqlite3 expects
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def summarize_batch(rows, config, order_offset):
+    # Per-number state of one prepared batch, in the layout CustomerStore.upsert_batch expects,
+    # with numbers in order of first appearance
+    groups = group_numbers(rows)
+    first_rows = rows.iloc[groups['first_row']]
+
+    valid_name_rows = groups['valid_name_row'].to_numpy()
+    first_valid_names = _take_rows(rows['name'], np.maximum(valid_name_rows, 0))
+    first_valid_names = first_valid_names.where(valid_name_rows >= 0, None)
+
+    if 'description' in rows.columns:
+        # Stored uncapped: later batches append to these, and the cap is applied on load
+        descriptions = join_descriptions(rows['__number_key'].to_numpy(), rows['description'], len(groups), None).tolist()
+    else:
+        descriptions = [None] * len(first_rows)
+
+    return list(zip(
+        first_rows['numberr'].tolist(),
+        (first_rows['__original_order'] + order_offset).tolist(),
+        _as_sql_values(first_rows['sp']),
+        _as_sql_values(first_rows['name']),
+        _as_sql_values(first_valid_names),
+        descriptions,
+        # Packed product flags, bit i = config['product_cols'][i]
+        groups['flags'].to_numpy().astype(np.int64).tolist(),
+    ))
+
+def load_store_customers(store, config):
+    # Rebuild the aggregate_customers layout from the store, so finalize_customers gives the
+    # same output as a full re-merge of every list that was fed to the store. Also returns
+    # the seen merge columns and the filled_names count of aggregate_customers.
+    _, seen_columns, _ = store.get_state()
+    stored = store.load_customers()
+
+    final_df = pd.DataFrame({
+        'numberr': stored['numberr'],
+        'name': stored['first_valid_name'].where(stored['first_valid_name'].notna(), stored['first_name']),
+        'sp': stored['sp'],
+    })
+    if 'description' in seen_columns:
+        descriptions = stored['description']
+        if config['max_description_length'] is not None:
+            # The store keeps every description; cap them like a full merge would
+            descriptions = [text[:config['max_description_length']] if isinstance(text, str) else text for text in descriptions]
+        final_df['description'] = descriptions
+    final_df['__flags'] = stored['flags'].to_numpy().astype(flag_dtype(config['product_cols']))
+    filled_count = int((stored['first_valid_name'].notna() & ~valid_name_mask(stored['first_name'])).sum())
+    return final_df, seen_columns, filled_count
+
+def merge_customers_incremental(df, store, config=None):
+    """Merge a new list into a persisted CustomerStore and return the full merged list.
+
+    Only the numbers present in df are written to the store. The returned DataFrame and
+    stats match merge_customers on the concatenation of every list fed to the store.
+    """
+    config = _resolve_config(config)
+    next_order, _, _ = store.get_state()
+    with _stage(config, 'prepare_rows', len(df)) as record:
+        rows, input_cols = prepare_rows(df.reset_index(drop=True), config)
+        record['rows_out'] = len(rows)
+
+    _progress(config, "Updating customer store...")
+    with _stage(config, 'update_store', len(rows)) as record:
+        batch = summarize_batch(rows, config, next_order)
+        store.upsert_batch(batch, len(df), input_cols, config['product_cols'])
+        record['rows_out'] = len(batch)
+
+    with _stage(config, 'load_store') as record:
+        stored_df, seen_columns, filled_count = load_store_customers(store, config)
+        record['rows_out'] = len(stored_df)
+    _report_filled_names(config, filled_count)
+    with _stage(config, 'finalize_customers', len(stored_df)) as record:
+        final_df = finalize_customers(stored_df, seen_columns, config)
+        record['rows_out'] = len(final_df)
+
+    stats = {
+        'input_rows': len(df),
+        'valid_phone_rows': len(rows),
+        'updated_customers': len(batch),
+        'total_customers': len(final_df),
+        'filled_names': filled_count,
+        'expert_distribution': expert_distribution(final_df, config['target_sales_experts']),
+    }
+    return final_df, stats
+
+# Rows converted to Python values and written at a time by the output writers
+OUTPUT_CHUNK_SIZE = 10000
+
+def _output_row_chunks(final_df, chunk_size=OUTPUT_CHUNK_SIZE):
+    # Yield the output rows in chunks of plain Python values, with None for empty cells
+    for start in range(0, len(final_df), chunk_size):
+        block = final_df.iloc[start:start + chunk_size].astype(object)
+        yield block.where(block.notna(), None).values.tolist()
+
+def write_xlsx(final_df, path):
+    # Write-only workbook: rows are streamed to disk instead of kept as cell objects
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    # Same header style as DataFrame.to_excel
+    thin = Side(style='thin')
+    header = []
+    for col in final_df.columns:
+        cell = WriteOnlyCell(sheet, value=col)
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal='center', vertical='top')
+        header.append(cell)
+    sheet.append(header)
+    for rows in _output_row_chunks(final_df):
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+def write_csv(final_df, path):
+    # UTF-8 with BOM so Excel shows the Persian text correctly
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(final_df.columns)
+        for rows in _output_row_chunks(final_df):
+            writer.writerows(rows)
+
+def write_parquet(final_df, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+
+    # Arrow columns need one type: columns mixing text and numbers (e.g. numeric names) are written as text
+    mixed_cols = [
+        col for col in final_df.columns
+        if final_df[col].dtype == object
+        and pd.api.types.infer_dtype(final_df[col], skipna=True) not in ('string', 'integer', 'floating', 'mixed-integer-float', 'boolean', 'empty')
+    ]
+
+    def arrow_block(block):
+        block = block.copy()
+        for col in mixed_cols:
+            block[col] = block[col].where(block[col].isna(), block[col].astype(str))
+        return block
+
+    # Column types come from the whole frame so every row group shares one schema
+    schema = pa.schema([
+        pa.field(col, pa.string()) if col in mixed_cols
+        else pa.Schema.from_pandas(final_df[[col]], preserve_index=False).field(0)
+        for col in final_df.columns
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, len(final_df), OUTPUT_CHUNK_SIZE):
+            block = arrow_block(final_df.iloc[start:start + OUTPUT_CHUNK_SIZE])
+            writer.write_table(pa.Table.from_pandas(block, schema=schema, preserve_index=False))
+
+def write_sqlite(final_df, path, table='customers'):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    quoted_cols = ', '.join('"{}"'.format(str(col).replace('"', '""')) for col in final_df.columns)
+    cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+    cursor.execute(f'CREATE TABLE "{table}" ({quoted_cols})')
+    placeholders = ', '.join('?' * len(final_df.columns))
+    for rows in _output_row_chunks(final_df):
+        cursor.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', rows)
+    conn.commit()
+    conn.close()
+
+# Output writers by format name; the format is picked from the file extension unless given
+OUTPUT_WRITERS = {
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+    'parquet': write_parquet,
+    'sqlite': write_sqlite,
+}
+OUTPUT_EXTENSIONS = {'.xlsx': 'xlsx', '.csv': 'csv', '.parquet': 'parquet', '.db': 'sqlite', '.sqlite': 'sqlite'}
+
+def write_output(final_df, path, output_format=None):
+    """Write the merged list to path, keeping its column order ('products' last)"""
+    if output_format is None:
+        extension = path[path.rfind('.'):].lower() if '.' in path else ''
+        output_format = OUTPUT_EXTENSIONS.get(extension, 'xlsx')
+    if output_format not in OUTPUT_WRITERS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    OUTPUT_WRITERS[output_format](final_df, path)
+
+def print_stats(stats):
+    # Print distribution statistics
+    print("\n=== Distribution of customers among sales experts ===")
+    for expert, share in stats['expert_distribution'].items():
+        print(f"{expert}: {share['count']} customer ({share['percentage']:.1f}%)")
+
+    print(f"\nTotal customers: {stats['total_customers']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge duplicate customers of an Excel list by phone number.")
+    parser.add_argument('input', nargs='*', default=[DEFAULT_INPUT_PATH], help="input xlsx/csv files, directories or glob patterns, merged as one list in the given order (default: list.xlsx)")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT_PATH, help="output file (default: final_merged_list.xlsx)")
+    parser.add_argument('--format', choices=sorted(OUTPUT_WRITERS), help="output format (default: from the output file extension)")
+    parser.add_argument('--no-wait', action='store_true', help="exit without waiting for Enter (for batch jobs)")
+    parser.add_argument('--store', help="SQLite customer store for incremental merging: only numbers in the input are updated")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows converted at a time while reading the input (bounds peak memory)")
+    parser.add_argument('--workers', type=int, help="processes parsing input files in parallel (default: number of CPUs)")
+    parser.add_argument('--no-cache', action='store_true', help="always parse the input instead of using the parse cache")
+    parser.add_argument('--max-description-length', type=int, help="keep at most this many characters of each customer's merged description")
+    parser.add_argument('--arrow-strings', action='store_true', help="keep names and descriptions as Arrow strings while merging (needs pyarrow, lowers memory)")
+    parser.add_argument('--profile', metavar='REPORT', help="write per-stage time and memory to a JSON report (also logged to app_history.db)")
+    parser.add_argument('--duplicates', metavar='REVIEW', help="also write likely duplicate customers (similar names, different numbers) to a review file")
+    args = parser.parse_args(argv)
+
+    config = {'profiler': StageProfiler() if args.profile else None, 'arrow_strings': args.arrow_strings,
+              'max_description_length': args.max_description_length}
+    config = _resolve_config(config)
+
+    try:
+        with _stage(config, 'read_input') as record:
+            input_paths = expand_input_paths(args.input)
+            df = read_input_files(input_paths, columns=merge_input_cols, chunk_size=args.chunk_size,
+                                  use_cache=not args.no_cache, max_workers=args.workers)
+            record['rows_out'] = len(df)
+    except FileNotFoundError:
+        print("Excel file not found. Please check the file name.")
+        return
+
+    if args.store:
+        final_df, stats = merge_customers_incremental(df, CustomerStore(args.store), config)
+    else:
+        final_df, stats = merge_customers(df, config)
+
+    with _stage(config, 'write_output', len(final_df)) as record:
+        write_output(final_df, args.output, args.format)
+        record['rows_out'] = len(final_df)
+    print(f"\n'{args.output}' successfully created!")
+
+    if args.duplicates:
+        # Imported here: duplicates imports from this module
+        from duplicates import find_near_duplicates, write_review_sheet
+        with _stage(config, 'near_duplicates', len(final_df)) as record:
+            pairs = find_near_duplicates(final_df)
+            record['rows_out'] = len(pairs)
+        write_review_sheet(pairs, args.duplicates)
+        print(f"{len(pairs)} likely duplicate pairs written to '{args.duplicates}'")
+
+    if config['profiler'] is not None:
+        config['profiler'].save(args.profile)
+        with Database() as db:
+            config['profiler'].log_to(db)
+        print(f"Profile report saved to '{args.profile}'")
+
+    print_stats(stats)
+    print("Processing completed successfully!")
+
+    if not args.no_wait:
+        input("\nPress Enter to close the window...")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import glob
+import os
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from excel_reader import DEFAULT_CHUNK_SIZE, read_excel_streaming
+from parse_cache import DEFAULT_CACHE_DIR, ParseCache
+
+INPUT_EXTENSIONS = ('.xlsx', '.csv')
+
+
+def expand_input_paths(patterns: Sequence[str]) -> List[str]:
+    """Turn files, directories and glob patterns into a list of input files.
+
+    Files keep the order they are given in; the files of a directory or glob are
+    sorted by name. Temporary Excel lock files (~$...) are skipped.
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(
+                os.path.join(pattern, name) for name in os.listdir(pattern)
+                if name.lower().endswith(INPUT_EXTENSIONS)
+            )
+        elif os.path.exists(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(path for path in glob.glob(pattern) if path.lower().endswith(INPUT_EXTENSIONS))
+        paths += [path for path in matches if not os.path.basename(path).startswith('~$') and path not in paths]
+    return paths
+
+
+def read_input_file(file_path: str, columns: Optional[Sequence] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, use_cache: bool = True,
+                    cache_dir: str = DEFAULT_CACHE_DIR) -> pd.DataFrame:
+    """Read one xlsx (through the parse cache) or csv input file"""
+    if file_path.lower().endswith('.csv'):
+        wanted = set(columns) if columns is not None else None
+        # utf-8-sig also reads files written by Excel or write_csv with a BOM
+        return pd.read_csv(
+            file_path, encoding='utf-8-sig',
+            usecols=(lambda col: col in wanted) if wanted is not None else None,
+        )
+    if not use_cache:
+        return read_excel_streaming(file_path, columns=columns, chunk_size=chunk_size)
+    return ParseCache(cache_dir).read_excel(file_path, columns=columns, chunk_size=chunk_size)
+
+
+def _read_input_file_args(args) -> pd.DataFrame:
+    # Module-level wrapper so worker processes can unpickle the call
+    return read_input_file(*args)
+
+
+def read_input_files(file_paths: Sequence[str], columns: Optional[Sequence] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, use_cache: bool = True,
+                     max_workers: Optional[int] = None, cache_dir: str = DEFAULT_CACHE_DIR) -> pd.DataFrame:
+    """Parse input files in parallel and stack them into one list.
+
+    Files are parsed on a process pool (one file per task) and concatenated in the
+    given order with a fresh index, so the index, and with it __original_order in
+    prepare_rows, follows file order and then row order.
+    """
+    if not file_paths:
+        raise FileNotFoundError("No input files found")
+
+    tasks = [(path, columns, chunk_size, use_cache, cache_dir) for path in file_paths]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if max_workers == 1:
+        frames = [_read_input_file_args(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(_read_input_file_args, tasks))
+
+    if len(frames) == 1:
+        return frames[0]
+    # Columns missing from some files are left empty for their rows
+    return pd.concat(frames, ignore_index=True, sort=False)
@@ -1,8 +1,13 @@
 import flet as ft
-from database import Database
+from database import DEFAULT_ACTION_RETENTION_DAYS, Database
+from parse_cache import ParseCache
+from file import merge_customers
+from rfm import DEFAULT_RFM_CONFIG, compute_rfm, dropped_orders_message
+from profiler import StageProfiler
 from datetime import datetime
 import pandas as pd
 import os
+import threading
 from io import BytesIO
 
 
@@ -21,6 +26,7 @@ class MainApp:
     def __init__(self, page: ft.Page):
         self.page = page
         self.db = Database()
+        self.parse_cache = ParseCache()
         
         # Setup page
         self.setup_page()
@@ -34,6 +40,9 @@ class MainApp:
         self.excel_data = None
         self.excel_df = None
         self.filtered_df = None
+        # The list as loaded from the file; merges and RFM scores are computed from it
+        # while the table (excel_df) may be showing the scores or a merged list
+        self.loaded_df = None
         self.column_sort_states = {}  # Track sort state for each column
         self.column_filter_states = {}  # Track filter state for each column (None: all, True: only 1, False: only empty)
         
@@ -46,8 +55,17 @@ class MainApp:
         # Build UI
         self.build_ui()
         
+        # Close the database connection when the session ends. Not on disconnect: a
+        # dropped connection can come back to the same session, which still needs it.
+        # The desktop window exiting the process is covered by Database's atexit close.
+        self.page.on_close = self.on_app_close
+        
         # Log app start
         self.db.log_action("app_started", {"timestamp": datetime.now().isoformat()})
+        
+        # Roll old history up into weekly counts off the UI thread
+        retention_days = self.db.get_setting_int("action_retention_days", DEFAULT_ACTION_RETENTION_DAYS)
+        threading.Thread(target=self.db.compact_actions, args=(retention_days,), daemon=True).start()
     
     def setup_page(self):
         """Configure page settings"""
@@ -151,7 +169,7 @@ class MainApp:
     
     def create_main_content(self):
         """Create main content area with search bar"""
-        search_bar = ft.TextField(
+        self.search_bar = ft.TextField(
             hint_text="Search",
             prefix_icon="search",
             border_radius=8,
@@ -163,6 +181,9 @@ class MainApp:
             on_change=self.on_search_change
         )
         
+        # Past queries matching what is typed, filled by on_search_change
+        self.search_suggestions = ft.Column(controls=[], spacing=0, visible=False)
+        
         # Main content area - will be updated when Excel is loaded
         self.main_content_area = ft.Container(
             expand=True,
@@ -184,7 +205,10 @@ class MainApp:
             content=ft.Column(
                 controls=[
                     ft.Container(
-                        content=search_bar,
+                        content=ft.Column(
+                            controls=[self.search_bar, self.search_suggestions],
+                            spacing=2
+                        ),
                         padding=ft.padding.all(20),
                         width=600,
                         alignment=ft.alignment.top_center
@@ -462,7 +486,11 @@ class MainApp:
     # Event handlers
     def on_search(self, e):
         """Handle search submission"""
-        query = e.control.value
+        self.run_search(e.control.value)
+    
+    def run_search(self, query: str):
+        """Save and run a search query"""
+        self.hide_search_suggestions()
         if query:
             self.db.save_search(query)
             self.db.log_action("search_performed", {"query": query})
@@ -470,8 +498,28 @@ class MainApp:
             print(f"Searching for: {query}")
     
     def on_search_change(self, e):
-        """Handle search text changes"""
-        pass
+        """Suggest past queries starting with the typed text"""
+        suggestions = self.db.get_search_suggestions(e.control.value or "")
+        self.search_suggestions.controls = [
+            ft.TextButton(
+                text=suggestion,
+                on_click=lambda e, suggestion=suggestion: self.on_suggestion_click(suggestion)
+            )
+            for suggestion in suggestions
+        ]
+        self.search_suggestions.visible = bool(suggestions)
+        self.page.update()
+    
+    def on_suggestion_click(self, suggestion: str):
+        """Fill the search box with a suggested query and run it"""
+        self.search_bar.value = suggestion
+        self.run_search(suggestion)
+    
+    def hide_search_suggestions(self):
+        """Hide the suggestion list under the search box"""
+        self.search_suggestions.controls = []
+        self.search_suggestions.visible = False
+        self.page.update()
     
     def on_history_click(self, e):
         """Handle history button click"""
@@ -485,10 +533,45 @@ class MainApp:
         self.open_upload_popup()
     
     def on_rfm_click(self, e):
-        """Handle RFM button click"""
+        """Score the customers of the loaded order list by recency, frequency and monetary value"""
         self.db.log_action("rfm_button_clicked")
-        # TODO: Implement RFM functionality
-        print("RFM clicked")
+        if self.loaded_df is None:
+            # RFM needs an order list: ask for one first
+            self.open_upload_popup()
+            return
+        try:
+            # Show loading indicator
+            self.show_loading_indicator()
+            self.page.update()
+            
+            # Order columns can be renamed in the settings for exports with other headers
+            config = {
+                "phone_col": self.db.get_setting("rfm_phone_column", DEFAULT_RFM_CONFIG["phone_col"]),
+                "date_col": self.db.get_setting("rfm_date_column", DEFAULT_RFM_CONFIG["date_col"]),
+                "amount_col": self.db.get_setting("rfm_amount_column", DEFAULT_RFM_CONFIG["amount_col"]),
+            }
+            stats = {}
+            scored = compute_rfm(self.loaded_df, config, stats)
+            self.excel_df = scored
+            self.filtered_df = self.excel_df.copy()
+            self.column_sort_states = {}
+            self.column_filter_states = {}
+            
+            # Log action
+            self.db.log_action("rfm_computed", {"customers": len(scored), "segments": scored["segment"].value_counts().to_dict(), **stats})
+            
+            # Display scored customers in main content
+            self.display_excel_table()
+            
+            # Orders without a readable phone number or date are left out of the scores
+            message = dropped_orders_message(stats)
+            if message:
+                self.show_error_message(message)
+            
+        except Exception as ex:
+            # Restore the table and show error message
+            self.display_excel_table()
+            self.show_error_message(f"Error computing RFM: {str(ex)}")
     
     def on_crm_click(self, e):
         """Handle CRM button click"""
@@ -506,6 +589,11 @@ class MainApp:
         self.db.log_action("dashboard_button_clicked")
         self.open_dashboard_popup()
     
+    def on_app_close(self, e):
+        """Log the app exit and close the database connection"""
+        self.db.log_action("app_closed", {"timestamp": datetime.now().isoformat()})
+        self.db.close()
+    
     def on_profile_click(self, e):
         """Handle profile icon click"""
         self.db.log_action("profile_icon_clicked")
@@ -686,8 +774,11 @@ class MainApp:
             self.show_loading_indicator()
             self.page.update()
             
-            # Read Excel file
-            self.excel_df = pd.read_excel(file_path)
+            # Read Excel file (read-only row streaming keeps memory bounded on large exports);
+            # reopening the same unchanged file is served from the parse cache
+            use_cache = self.db.get_setting_bool("parse_cache_enabled", True)
+            self.excel_df = self.parse_cache.read_excel(file_path, use_cache=use_cache)
+            self.loaded_df = self.excel_df
             self.filtered_df = self.excel_df.copy()
             
             # Log action
@@ -708,6 +799,36 @@ class MainApp:
             # Show error message
             self.show_error_message(f"Error loading file: {str(e)}")
     
+    def on_merge_click(self, e):
+        """Merge duplicate customers of the loaded list in-process"""
+        if self.loaded_df is None:
+            return
+        try:
+            # Show loading indicator
+            self.show_loading_indicator()
+            self.page.update()
+            
+            # Merge the DataFrame that is already loaded instead of re-reading the file; not
+            # the table on screen, which may be RFM scores or an already merged list
+            profiler = StageProfiler()
+            final_df, stats = merge_customers(self.loaded_df, {"verbose": False, "profiler": profiler})
+            self.excel_df = final_df.reset_index(drop=True)
+            self.filtered_df = self.excel_df.copy()
+            self.column_sort_states = {}
+            self.column_filter_states = {}
+            
+            # Log action
+            self.db.log_action("customer_list_merged", {"rows": stats['input_rows'], "customers": stats['total_customers']})
+            profiler.log_to(self.db)
+            
+            # Display merged list in main content
+            self.display_excel_table()
+            
+        except Exception as ex:
+            # Restore the table and show error message
+            self.display_excel_table()
+            self.show_error_message(f"Error merging list: {str(ex)}")
+    
     def display_excel_table(self):
         """Display Excel data in a table with filters and sorting"""
         if self.excel_df is None or len(self.excel_df) == 0:
@@ -808,6 +929,15 @@ class MainApp:
                                 color="#2196F3"
                             ),
                             ft.Container(expand=True),
+                            ft.ElevatedButton(
+                                text="ادغام مشتریان",
+                                icon="merge_type",
+                                on_click=self.on_merge_click,
+                                style=ft.ButtonStyle(
+                                    bgcolor="#2196F3",
+                                    color="#FFFFFF"
+                                )
+                            ),
                             ft.Text(
                                 f"نمایش {len(self.filtered_df)} ردیف",
                                 size=14,
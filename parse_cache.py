@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from typing import List, Optional, Sequence
+
+from excel_reader import DEFAULT_CHUNK_SIZE, read_excel_streaming
+
+# Feather needs pyarrow; without it (or for frames Arrow can't store) entries are pickled
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+DEFAULT_CACHE_DIR = ".parse_cache"
+DEFAULT_MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+CACHE_EXTENSIONS = ('.feather', '.pkl')
+
+# Part of every cache key; bump it when read_excel_streaming starts returning different
+# frames for the same file, so entries parsed by the old reader are not served
+# (2: columns are typed over the whole sheet instead of per chunk)
+READER_VERSION = 2
+
+
+def _remove_if_exists(path: str):
+    # Several processes share the cache directory, so a file may already be gone
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ParseCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+        """Cache of parsed workbooks, evicting least recently used entries above max_bytes"""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def cache_key(self, file_path: str, columns: Optional[Sequence] = None) -> str:
+        """Key a workbook by path, size, mtime and content hash plus the columns read.
+
+        chunk_size is not part of the key: it only changes memory use, not the frame.
+        """
+        stat = os.stat(file_path)
+        content_hash = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                content_hash.update(block)
+
+        key_data = json.dumps({
+            'reader': READER_VERSION,
+            'path': os.path.abspath(file_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'content': content_hash.hexdigest(),
+            'columns': list(columns) if columns is not None else None,
+        }, ensure_ascii=False, default=str)
+        return hashlib.blake2b(key_data.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _entry_paths(self, key: str) -> List[str]:
+        return [os.path.join(self.cache_dir, key + ext) for ext in CACHE_EXTENSIONS]
+
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        """Get a cached DataFrame, or None on a miss"""
+        for path in self._entry_paths(key):
+            if not os.path.exists(path):
+                continue
+            try:
+                df = pd.read_feather(path) if path.endswith('.feather') else pd.read_pickle(path)
+            except Exception:
+                # Unreadable entry (e.g. written by another version, or evicted by another
+                # process since the exists check): treat as a miss
+                _remove_if_exists(path)
+                return None
+            # Touch the entry so eviction sees it as recently used
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            return df
+        return None
+
+    def save(self, key: str, df: pd.DataFrame):
+        """Store a DataFrame and evict old entries if the cache grew too large"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        feather_path, pickle_path = self._entry_paths(key)
+
+        # Write to a temporary file first so readers never see a partial entry; the
+        # process id keeps pool workers saving the same file from sharing one
+        tmp_suffix = f'.{os.getpid()}.tmp'
+        path = None
+        if HAS_PYARROW:
+            try:
+                df.to_feather(feather_path + tmp_suffix)
+                path = feather_path
+            except (ValueError, TypeError):
+                # Arrow can't store mixed-type object columns
+                _remove_if_exists(feather_path + tmp_suffix)
+        if path is None:
+            df.to_pickle(pickle_path + tmp_suffix)
+            path = pickle_path
+        os.replace(path + tmp_suffix, path)
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes.
+
+        Other processes (e.g. read_input_files workers) may evict the same entries at
+        the same time, so entries that are already gone are skipped.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_EXTENSIONS):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove_if_exists(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def clear(self):
+        """Remove every cache entry"""
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(CACHE_EXTENSIONS):
+                    _remove_if_exists(os.path.join(self.cache_dir, name))
+
+    def read_excel(self, file_path: str, columns: Optional[Sequence] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, use_cache: bool = True) -> pd.DataFrame:
+        """Read a workbook with read_excel_streaming, serving repeated reads from the cache"""
+        if not use_cache:
+            return read_excel_streaming(file_path, columns=columns, chunk_size=chunk_size)
+
+        key = self.cache_key(file_path, columns)
+        df = self.load(key)
+        if df is None:
+            df = read_excel_streaming(file_path, columns=columns, chunk_size=chunk_size)
+            self.save(key, df)
+        return df
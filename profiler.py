@@ -0,0 +1,110 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def _windows_peak_rss() -> Optional[int]:
+    """Peak working set of this process in bytes, read through psapi"""
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident memory of this process so far, or None if it can't be read"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return _windows_peak_rss()
+
+
+class StageProfiler:
+    def __init__(self):
+        """Collect wall time, CPU time, peak RSS growth and row counts of pipeline stages"""
+        self.stages: List[Dict] = []
+        self.depth = 0
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """Time the enclosed block; set record['rows_out'] inside it to record the output size.
+
+        Stages can be nested; depth is 0 for top-level stages, and records are listed in
+        the order the stages started. peak_rss_increase_mb is how far the stage raised the
+        process's peak resident memory: the OS only reports the peak of the whole process
+        so far, so a stage that stays below an earlier peak shows 0.
+        """
+        record = {'stage': name, 'depth': self.depth, 'rows_in': rows_in, 'rows_out': None}
+        self.stages.append(record)
+        self.depth += 1
+        peak_start = peak_rss_bytes()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_seconds'] = round(time.process_time() - cpu_start, 4)
+            peak_end = peak_rss_bytes()
+            if peak_start is not None and peak_end is not None:
+                record['peak_rss_increase_mb'] = round((peak_end - peak_start) / (1024 * 1024), 1)
+            else:
+                record['peak_rss_increase_mb'] = None
+            self.depth -= 1
+
+    def report(self) -> Dict:
+        """Get the collected stages with totals as a JSON-serializable dict.
+
+        Totals add up the top-level stages only (nested stages are part of their parent);
+        process_peak_rss_mb is the peak resident memory of the process when reported.
+        """
+        top_level = [stage for stage in self.stages if stage['depth'] == 0]
+        peak = peak_rss_bytes()
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'stages': self.stages,
+            'total_wall_seconds': round(sum(stage['wall_seconds'] for stage in top_level), 4),
+            'total_cpu_seconds': round(sum(stage['cpu_seconds'] for stage in top_level), 4),
+            'process_peak_rss_mb': round(peak / (1024 * 1024), 1) if peak is not None else None,
+        }
+
+    def save(self, path: str):
+        """Write the report to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def log_to(self, db, action_type: str = 'merge_profile'):
+        """Keep the report in the app history through Database.log_action"""
+        db.log_action(action_type, self.report())
@@ -0,0 +1,352 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+from file import clean_phone_numbers, write_output, OUTPUT_WRITERS
+from input_files import expand_input_paths, read_input_files
+from rfm_store import RfmStore
+
+DEFAULT_RFM_CONFIG = {
+    # Order-level input: one row per order
+    'phone_col': 'numberr',
+    'date_col': 'date',
+    'amount_col': 'amount',
+    # Day recency is measured from (default: the day after the last order in the data)
+    'as_of': None,
+    'n_bins': 5,
+}
+
+# Decimal places of amounts kept when summing spend
+AMOUNT_DECIMALS = 2
+
+# Day 0 of Excel serial dates (Excel counts 1900 as a leap year, hence the 30th)
+EXCEL_EPOCH = '1899-12-30'
+# Largest serial day kept: 2262-04-10, the last whole day pandas timestamps reach
+EXCEL_MAX_SERIAL = 132319
+
+# Segment of every (R, F) score pair, first match wins; M only breaks ties in rfm_score.
+# The usual RFM segment map: recent frequent buyers are champions, old frequent ones at risk.
+SEGMENT_RULES = [
+    ('Champions', (5,), (4, 5)),
+    ('Loyal Customers', (3, 4, 5), (4, 5)),
+    ('Potential Loyalists', (4, 5), (2, 3)),
+    ('New Customers', (5,), (1,)),
+    ('Promising', (4,), (1,)),
+    ('Need Attention', (3,), (3,)),
+    ('About to Sleep', (3,), (1, 2)),
+    ("Can't Lose Them", (1, 2), (5,)),
+    ('At Risk', (1, 2), (3, 4)),
+    ('Hibernating', (1, 2), (1, 2)),
+]
+
+
+def _segment_grid():
+    # SEGMENT_RULES as a 5x5 lookup table indexed by [r_score - 1, f_score - 1]
+    grid = np.full((5, 5), None, dtype=object)
+    for segment, r_scores, f_scores in reversed(SEGMENT_RULES):
+        for r in r_scores:
+            for f in f_scores:
+                grid[r - 1, f - 1] = segment
+    return grid
+
+SEGMENT_GRID = _segment_grid()
+
+
+def _resolve_config(config):
+    resolved = dict(DEFAULT_RFM_CONFIG)
+    if config:
+        resolved.update(config)
+    return resolved
+
+
+def _parse_date(text):
+    # One date in any layout to_datetime understands; the wall-clock day is kept when
+    # the text has a time zone
+    date = pd.to_datetime(text, errors='coerce')
+    if isinstance(date, pd.Timestamp) and date.tzinfo is not None:
+        date = date.tz_localize(None)
+    return date
+
+
+def _excel_serial_dates(values):
+    # Numbers in a date column are Excel serial days (45296 is 2024-01-05); numbers that
+    # can't be one (e.g. 20240105, tens of thousands of years away) become NaT
+    values = values.where((values >= 1) & (values < EXCEL_MAX_SERIAL + 1))
+    return pd.to_datetime(values, unit='D', origin=EXCEL_EPOCH, errors='coerce').astype('datetime64[ns]')
+
+
+def _to_dates(series):
+    # Numeric dates are read as Excel serial days rather than nanoseconds since 1970,
+    # which would put every order on 1970-01-01.
+    # to_datetime guesses one format from the first value and turns text in any other
+    # layout into NaT, so a column mixing "2024-01-05" and "2024/01/06" would lose half
+    # its orders. Text the guessed format missed is parsed again, once per distinct value.
+    if pd.api.types.is_bool_dtype(series):
+        return pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    if pd.api.types.is_numeric_dtype(series):
+        return _excel_serial_dates(series.astype(np.float64))
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.to_datetime(series, errors='coerce')
+
+    is_number = series.map(
+        lambda value: isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+    ).to_numpy(dtype=bool)
+    if is_number.any():
+        values = np.full(len(series), np.datetime64('NaT'), dtype='datetime64[ns]')
+        values[is_number] = _excel_serial_dates(series[is_number].astype(np.float64)).to_numpy(dtype='datetime64[ns]')
+        values[~is_number] = _to_dates(series[~is_number]).to_numpy(dtype='datetime64[ns]')
+        return pd.Series(values, index=series.index)
+
+    dates = pd.to_datetime(series, errors='coerce')
+    retry = (dates.isna() & series.map(lambda value: isinstance(value, str))).to_numpy(dtype=bool)
+    if retry.any():
+        codes, texts = pd.factorize(series[retry])
+        parsed = pd.DatetimeIndex([_parse_date(text) for text in texts]).as_unit('ns')
+        values = dates.to_numpy(dtype='datetime64[ns]').copy()
+        values[retry] = parsed.to_numpy()[codes]
+        dates = pd.Series(values, index=series.index)
+    return dates
+
+
+def _to_days(series):
+    # Dates as whole days since 1970-01-01 (NaN when the value isn't a date)
+    dates = _to_dates(series)
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64).astype(np.float64)
+    days[dates.isna().to_numpy()] = np.nan
+    return days
+
+
+def _to_amounts(series):
+    # Amounts may be written with thousands separators ("1,250,000")
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(series, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+
+def prepare_orders(df, config=None, stats=None):
+    """Normalize the phone, date and amount columns of an order list.
+
+    Phones are cleaned with the merge rules (clean_phone_numbers); orders without a
+    valid number or date are dropped and missing amounts count as 0. When a stats dict
+    is given, the dropped orders are counted in it: orders, invalid_phone, invalid_date.
+    Returns a DataFrame with numberr, day (days since 1970-01-01) and amount.
+    """
+    config = _resolve_config(config)
+    missing = [config[key] for key in ('phone_col', 'date_col', 'amount_col') if config[key] not in df.columns]
+    if missing:
+        raise KeyError(f"Order list is missing column(s): {', '.join(map(str, missing))}")
+
+    # Customers repeat across orders, so each distinct phone text is cleaned once.
+    # str() is what clean_phone_number applies to every value anyway, and plain strings
+    # hash much faster than a column mixing numbers and text.
+    raw_codes, raw_phones = pd.factorize(df[config['phone_col']].astype(str))
+    cleaned = clean_phone_numbers(pd.Series(raw_phones, dtype=object)).to_numpy(dtype=object)
+    numbers = np.full(len(df), None, dtype=object)
+    numbers[raw_codes >= 0] = cleaned[raw_codes[raw_codes >= 0]]
+
+    orders = pd.DataFrame({
+        'numberr': numbers,
+        'day': _to_days(df[config['date_col']]),
+        'amount': _to_amounts(df[config['amount_col']]),
+    })
+    valid_phone = orders['numberr'].notna().to_numpy()
+    valid_date = ~np.isnan(orders['day'].to_numpy())
+    if stats is not None:
+        stats['orders'] = stats.get('orders', 0) + len(orders)
+        stats['invalid_phone'] = stats.get('invalid_phone', 0) + int((~valid_phone).sum())
+        # Orders with a valid number whose date couldn't be read
+        stats['invalid_date'] = stats.get('invalid_date', 0) + int((valid_phone & ~valid_date).sum())
+    orders = orders[valid_phone & valid_date]
+    orders['day'] = orders['day'].astype(np.int64)
+    return orders.reset_index(drop=True)
+
+
+def aggregate_orders(orders):
+    """Per-customer last purchase day, order count and total spend in one grouped pass.
+
+    Spend is summed as whole hundredths (spend_units), which is exact in any order, so
+    totals built up batch by batch in an RfmStore equal those of a full rebuild.
+    """
+    units = np.rint(orders['amount'].to_numpy(dtype=np.float64) * 10 ** AMOUNT_DECIMALS).astype(np.int64)
+    customers = orders[['numberr', 'day']].assign(spend_units=units).groupby('numberr', sort=False).agg(
+        last_day=('day', 'max'),
+        frequency=('day', 'size'),
+        spend_units=('spend_units', 'sum'),
+    )
+    return _with_monetary(customers.reset_index())
+
+
+def _with_monetary(customers):
+    # Total spend in currency units from the exact spend_units
+    return customers.assign(monetary=customers['spend_units'].to_numpy(dtype=np.int64) / 10 ** AMOUNT_DECIMALS)
+
+
+def quantile_cut_points(values, n_bins=5):
+    """The n_bins - 1 inner quantiles of values, the bin edges of the scores"""
+    if len(values) == 0:
+        return np.zeros(n_bins - 1)
+    return np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])
+
+
+def bin_scores(values, cut_points, higher_is_better=True):
+    """Scores 1..len(cut_points) + 1 from the number of cut points below each value.
+
+    Equal values always get the same score, and the values tied at the bottom of a
+    heavily tied column (e.g. customers with one order) get the lowest score.
+    """
+    below = np.searchsorted(cut_points, values, side='left')
+    return (below + 1 if higher_is_better else len(cut_points) + 1 - below).astype(np.int64)
+
+
+def score_customers(customers, as_of=None, n_bins=5, cut_points=None):
+    """Add recency, quintile R/F/M scores and segments to per-customer aggregates.
+
+    customers needs numberr, last_day, frequency and monetary. as_of is the day recency
+    is counted from (date or days since 1970-01-01; default the day after the last
+    purchase). cut_points can pass precomputed {'recency', 'frequency', 'monetary'} edges.
+    Returns (scored DataFrame, cut points used).
+    """
+    last_day = customers['last_day'].to_numpy(dtype=np.int64)
+    if as_of is None:
+        as_of_day = int(last_day.max()) + 1 if len(last_day) else 0
+    elif isinstance(as_of, (int, np.integer)):
+        as_of_day = int(as_of)
+    else:
+        as_of_day = int(pd.Timestamp(as_of).to_datetime64().astype('datetime64[D]').astype(np.int64))
+
+    recency = as_of_day - last_day
+    frequency = customers['frequency'].to_numpy(dtype=np.int64)
+    monetary = customers['monetary'].to_numpy(dtype=np.float64)
+    if cut_points is None:
+        cut_points = {
+            'recency': quantile_cut_points(recency, n_bins),
+            'frequency': quantile_cut_points(frequency, n_bins),
+            'monetary': quantile_cut_points(monetary, n_bins),
+        }
+
+    r_score = bin_scores(recency, cut_points['recency'], higher_is_better=False)
+    f_score = bin_scores(frequency, cut_points['frequency'])
+    m_score = bin_scores(monetary, cut_points['monetary'])
+    # Segments are defined on the 5-level scale; other bin counts are mapped onto it
+    r_level = np.ceil(r_score * 5 / n_bins).astype(np.int64)
+    f_level = np.ceil(f_score * 5 / n_bins).astype(np.int64)
+
+    scored = pd.DataFrame({
+        'numberr': customers['numberr'].to_numpy(dtype=object),
+        'last_purchase': (last_day.astype('datetime64[D]')),
+        'recency': recency,
+        'frequency': frequency,
+        'monetary': monetary,
+        'r_score': r_score,
+        'f_score': f_score,
+        'm_score': m_score,
+        'rfm_score': r_score * 100 + f_score * 10 + m_score,
+        'segment': SEGMENT_GRID[r_level - 1, f_level - 1],
+    })
+    return scored, cut_points
+
+
+def compute_rfm(df, config=None, stats=None):
+    """RFM scores and segments of every customer in an order list, best customers first"""
+    config = _resolve_config(config)
+    customers = aggregate_orders(prepare_orders(df, config, stats))
+    scored, _ = score_customers(customers, config['as_of'], config['n_bins'])
+    return sort_rfm(scored)
+
+
+def update_rfm_store(df, store, config=None, stats=None):
+    """Add a new batch of orders to an RfmStore; only the customers in df are written.
+
+    Returns the number of customers updated.
+    """
+    config = _resolve_config(config)
+    orders = prepare_orders(df, config, stats)
+    customers = aggregate_orders(orders)
+    store.upsert_batch(
+        zip(
+            customers['numberr'].tolist(), customers['last_day'].tolist(),
+            customers['frequency'].tolist(), customers['spend_units'].tolist(),
+        ),
+        len(orders),
+    )
+    return len(customers)
+
+
+def score_rfm_store(store, config=None):
+    """RFM scores of every customer in an RfmStore, from its aggregates only.
+
+    Recency and the quintile cut points are recomputed from the per-customer aggregates,
+    so the result equals compute_rfm on every order ever added to the store.
+    """
+    config = _resolve_config(config)
+    customers = store.load_aggregates()
+    customers = customers.astype({'last_day': np.int64, 'frequency': np.int64, 'spend_units': np.int64})
+    scored, _ = score_customers(_with_monetary(customers), config['as_of'], config['n_bins'])
+    return sort_rfm(scored)
+
+
+def compute_rfm_incremental(df, store, config=None, stats=None):
+    """Append df to the store and return the RFM scores of all its customers"""
+    update_rfm_store(df, store, config, stats)
+    return score_rfm_store(store, config)
+
+
+def sort_rfm(scored):
+    """Order scored customers by RFM score, then spend, then number"""
+    return scored.sort_values(['rfm_score', 'monetary', 'numberr'], ascending=[False, False, True], ignore_index=True)
+
+
+def dropped_orders_message(stats):
+    """One line on the orders left out of the scores, or None when every order was used"""
+    dropped = stats.get('invalid_phone', 0) + stats.get('invalid_date', 0)
+    if not dropped:
+        return None
+    return (f"{dropped} of {stats['orders']} orders skipped "
+            f"({stats['invalid_phone']} without a valid phone number, {stats['invalid_date']} without a valid date)")
+
+
+def segment_summary(scored):
+    """Customer count, share and average R/F/M values per segment"""
+    summary = scored.groupby('segment').agg(
+        customers=('numberr', 'size'),
+        recency=('recency', 'mean'),
+        frequency=('frequency', 'mean'),
+        monetary=('monetary', 'mean'),
+    )
+    summary['share'] = (summary['customers'] / max(len(scored), 1)).round(3)
+    return summary.sort_values('customers', ascending=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score customers of an order list by recency, frequency and monetary value.")
+    parser.add_argument('input', nargs='+', help="order xlsx/csv files, directories or glob patterns")
+    parser.add_argument('-o', '--output', default='rfm.xlsx', help="output file (default: rfm.xlsx)")
+    parser.add_argument('--format', choices=sorted(OUTPUT_WRITERS), help="output format (default: from the output file extension)")
+    parser.add_argument('--phone-col', default=DEFAULT_RFM_CONFIG['phone_col'])
+    parser.add_argument('--date-col', default=DEFAULT_RFM_CONFIG['date_col'])
+    parser.add_argument('--amount-col', default=DEFAULT_RFM_CONFIG['amount_col'])
+    parser.add_argument('--as-of', help="date recency is counted from (default: the day after the last order)")
+    parser.add_argument('--store', help="SQLite RFM store: the input orders are added to its per-customer totals and all stored customers are scored")
+    parser.add_argument('--rebuild', action='store_true', help="clear the store before adding the input (full rebuild)")
+    args = parser.parse_args(argv)
+
+    config = {'phone_col': args.phone_col, 'date_col': args.date_col, 'amount_col': args.amount_col, 'as_of': args.as_of}
+    df = read_input_files(expand_input_paths(args.input), columns=[args.phone_col, args.date_col, args.amount_col])
+    stats = {}
+    if args.store:
+        store = RfmStore(args.store)
+        if args.rebuild:
+            store.clear()
+        scored = compute_rfm_incremental(df, store, config, stats)
+    else:
+        scored = compute_rfm(df, config, stats)
+    write_output(scored, args.output, args.format)
+    print(f"'{args.output}' successfully created! ({len(scored)} customers)")
+    message = dropped_orders_message(stats)
+    if message:
+        print(f"Warning: {message}")
+    print(segment_summary(scored).to_string())
+
+
+if __name__ == '__main__':
+    main()
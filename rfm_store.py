@@ -0,0 +1,100 @@
+import sqlite3
+import json
+import pandas as pd
+from typing import Iterable
+
+class RfmStore:
+    def __init__(self, db_path: str = "rfm.db"):
+        """Open the RFM aggregate store and create tables if they don't exist"""
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create necessary tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        # Running per-customer aggregates of every order appended so far.
+        # Days are counted from 1970-01-01; spend is kept in whole hundredths so the
+        # totals are exact whatever order the batches are added in.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS customer_rfm (
+                numberr TEXT PRIMARY KEY,
+                last_day INTEGER NOT NULL,
+                frequency INTEGER NOT NULL,
+                spend_units INTEGER NOT NULL
+            )
+        ''')
+
+        # Store-wide state: number of order rows appended
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def _get_meta(self, cursor, key: str, default):
+        cursor.execute('SELECT value FROM store_meta WHERE key = ?', (key,))
+        result = cursor.fetchone()
+        return json.loads(result[0]) if result else default
+
+    def _set_meta(self, cursor, key: str, value):
+        cursor.execute('''
+            INSERT OR REPLACE INTO store_meta (key, value)
+            VALUES (?, ?)
+        ''', (key, json.dumps(value)))
+
+    def get_order_count(self) -> int:
+        """Get the number of order rows appended to the store"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        count = self._get_meta(cursor, 'order_rows', 0)
+        conn.close()
+        return count
+
+    def upsert_batch(self, customers: Iterable[tuple], order_rows: int):
+        """Add the aggregates of one batch of orders in a single transaction.
+
+        Each item is (numberr, last_day, frequency, spend_units) for one customer of the
+        batch. Existing customers keep the later last purchase and add up orders and spend;
+        customers not in the batch are not touched.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.executemany('''
+            INSERT INTO customer_rfm (numberr, last_day, frequency, spend_units)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(numberr) DO UPDATE SET
+                last_day = MAX(customer_rfm.last_day, excluded.last_day),
+                frequency = customer_rfm.frequency + excluded.frequency,
+                spend_units = customer_rfm.spend_units + excluded.spend_units
+        ''', customers)
+        self._set_meta(cursor, 'order_rows', self._get_meta(cursor, 'order_rows', 0) + order_rows)
+
+        conn.commit()
+        conn.close()
+
+    def load_aggregates(self) -> pd.DataFrame:
+        """Get the aggregates of all stored customers"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT numberr, last_day, frequency, spend_units FROM customer_rfm')
+        rows = cursor.fetchall()
+        conn.close()
+
+        return pd.DataFrame.from_records(rows, columns=['numberr', 'last_day', 'frequency', 'spend_units'])
+
+    def clear(self):
+        """Remove all stored aggregates (before a full rebuild)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM customer_rfm')
+        cursor.execute('DELETE FROM store_meta')
+        conn.commit()
+        conn.close()
@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import Database
+
+
+def test_queued_rows_are_written_on_close(tmp_path):
+    path = str(tmp_path / 'history.db')
+    db = Database(path)
+    db.log_action('app_started')
+    db.save_search('Ali')
+    db.close()
+    # A second close (e.g. the atexit hook after the session ended) does nothing
+    db.close()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT action_type FROM user_actions').fetchall() == [('app_started',)]
+    assert conn.execute('SELECT query FROM search_queries').fetchall() == [('Ali',)]
+    conn.close()
+
+
+@pytest.mark.parametrize('call', [
+    lambda db: db.log_action('clicked'),
+    lambda db: db.save_search('Ali'),
+    lambda db: db.set_setting('theme', 'dark'),
+    lambda db: db.get_recent_actions(),
+    lambda db: db.get_actions_by_week(1, 2024),
+    lambda db: db.get_search_history(),
+    lambda db: db.get_search_suggestions('A'),
+    lambda db: db.compact_actions(),
+])
+def test_use_after_close_raises(tmp_path, call):
+    db = Database(str(tmp_path / 'history.db'))
+    db.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        call(db)
+
+
+def test_queueing_does_not_wait_for_the_connection(tmp_path):
+    # log_action/save_search must not block while a write or compaction holds db.lock
+    db = Database(str(tmp_path / 'history.db'))
+    done = threading.Event()
+
+    def queue_rows():
+        db.log_action('clicked')
+        db.save_search('Ali')
+        done.set()
+
+    with db.lock:
+        threading.Thread(target=queue_rows).start()
+        assert done.wait(2)
+    db.close()
+    assert db.get_writer_stats()['written_rows'] == 2
@@ -0,0 +1,75 @@
+import re
+import sqlite3
+
+import pytest
+
+from database import SCHEMA_VERSION, Database
+
+# A plan step that reads a whole table without an index, e.g. "SCAN user_actions".
+# "SCAN search_queries USING INDEX ..." walks an index in order and is fine.
+BARE_SCAN = re.compile(r'^SCAN \w+$')
+INDEXED = re.compile(r'USING (COVERING )?INDEX|USING (INTEGER )?PRIMARY KEY')
+
+# Queries that may sort their result in a temporary B-tree. Both sort only the rows the
+# index already narrowed down: one week of per-action-type counts for the summary, and
+# the saved queries starting with the typed prefix for the suggestions. Ordering by
+# count / use_count with an index would need one rewritten on every write.
+TEMP_BTREE_ALLOWED = {'get_actions_by_week (summary)', 'get_search_suggestions'}
+
+
+def check_plans(db):
+    plans = db.explain_query_plans()
+    assert set(plans) == {
+        'get_recent_actions', 'get_actions_by_week', 'get_actions_by_week (summary)',
+        'get_search_history', 'get_search_suggestions',
+    }
+    for name, steps in plans.items():
+        assert any(INDEXED.search(step) for step in steps), (name, steps)
+        assert not any(BARE_SCAN.match(step) for step in steps), (name, steps)
+        if name not in TEMP_BTREE_ALLOWED:
+            assert not any('TEMP B-TREE' in step for step in steps), (name, steps)
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'history.db'))
+    yield database
+    database.close()
+
+
+def test_new_database_is_migrated(db):
+    assert db.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    check_plans(db)
+
+
+def test_old_database_is_migrated(tmp_path):
+    # A database written before the migrations: original tables, no indexes, user_version 0
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE user_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, action_type TEXT NOT NULL, action_data TEXT,
+            timestamp TEXT NOT NULL, date TEXT NOT NULL, week_number INTEGER, year INTEGER
+        );
+        CREATE TABLE app_settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE search_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, search_query TEXT NOT NULL,
+            timestamp TEXT NOT NULL, date TEXT NOT NULL
+        );
+        INSERT INTO search_history (search_query, timestamp, date) VALUES
+            ('Ali', '2024-01-01T10:00:00', '2024-01-01'),
+            (' ali ', '2024-01-02T10:00:00', '2024-01-02'),
+            ('رضا', '2024-01-03T10:00:00', '2024-01-03');
+    ''')
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    try:
+        assert db.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        check_plans(db)
+        # Old searches are folded into one row per normalized query, latest first
+        assert db.get_search_history() == ['رضا', 'ali']
+        assert db.get_search_suggestions('AL') == ['ali']
+    finally:
+        db.close()
@@ -0,0 +1,60 @@
+import datetime
+import random
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from excel_reader import _ChunkColumn, _join_chunks, _typed_column, read_excel_streaming
+
+# Cell values by kind; columns are built from runs of a few kinds so that chunks of one
+# column can disagree (numeric text in one chunk, plain text in the next, ...)
+CELL_KINDS = {
+    'int': lambda rng: rng.randrange(-5, 10 ** 10),
+    'float': lambda rng: rng.randrange(1, 1000) + 0.5,
+    'numeric_text': lambda rng: rng.choice(['09123456000', '1.50', '123', '-4', '1e3']),
+    'text': lambda rng: rng.choice(['Ali', 'رضا', 'x1']),
+    'blank': lambda rng: None,
+    'date': lambda rng: datetime.datetime(2024, 1, rng.randrange(1, 28)),
+    'bool': lambda rng: rng.random() < 0.5,
+}
+
+
+def random_column(rng):
+    kinds = rng.sample(sorted(CELL_KINDS), rng.randrange(1, 4))
+    length = rng.randrange(0, 30)
+    values = []
+    while len(values) < length:
+        make = CELL_KINDS[rng.choice(kinds)]
+        values += [make(rng) for _ in range(rng.randrange(1, 8))]
+    return values[:length]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_chunked_typing_matches_whole_column(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        values = random_column(rng)
+        expected = _typed_column(values)
+        for chunk_size in (1, 3, 7, 50):
+            chunks = [_ChunkColumn(values[i:i + chunk_size]) for i in range(0, len(values), chunk_size)]
+            pd.testing.assert_series_equal(_join_chunks(chunks or [_ChunkColumn([])]), expected, check_index_type=False)
+
+
+def test_chunk_size_does_not_change_the_frame(tmp_path):
+    path = str(tmp_path / 'list.xlsx')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['numberr', 'name', 'description', 'count'])
+    for i in range(20):
+        sheet.append([
+            '09123456%03d' % i if i < 10 else 9123456000 + i,
+            '123' if i < 8 else f'name{i}',
+            '1.50' if i < 6 else (None if i % 2 else 'text'),
+            i if i % 3 else None,
+        ])
+    workbook.save(path)
+
+    expected = pd.read_excel(path)
+    for chunk_size in (1, 5, 10, 50000):
+        pd.testing.assert_frame_equal(read_excel_streaming(path, chunk_size=chunk_size), expected)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import generate_customer_list
+from customer_store import CustomerStore
+from file import merge_customers, merge_customers_incremental
+
+QUIET = {'verbose': False}
+
+
+def merge_in_batches(tmp_path, customers, cuts, config=QUIET):
+    store = CustomerStore(str(tmp_path / 'customers.db'))
+    for start, end in zip([0] + cuts, cuts + [len(customers)]):
+        merged, stats = merge_customers_incremental(customers.iloc[start:end], store, config)
+    return merged, stats
+
+
+@pytest.mark.parametrize('seed, cuts', [(1, [2500]), (2, [1000, 1001, 3000]), (3, [4000])])
+def test_incremental_merge_equals_full_merge(tmp_path, seed, cuts):
+    customers = generate_customer_list(5000, seed=seed)
+    merged, stats = merge_in_batches(tmp_path, customers, cuts)
+    expected, expected_stats = merge_customers(customers, QUIET)
+
+    pd.testing.assert_frame_equal(merged.reset_index(drop=True), expected.reset_index(drop=True))
+    assert stats['total_customers'] == expected_stats['total_customers']
+    assert stats['filled_names'] == expected_stats['filled_names']
+
+
+def test_incremental_merge_without_description_column(tmp_path):
+    customers = generate_customer_list(3000, seed=4).drop(columns='description')
+    merged, _ = merge_in_batches(tmp_path, customers, [1500])
+    expected, _ = merge_customers(customers, QUIET)
+    pd.testing.assert_frame_equal(merged.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_description_cap_does_not_truncate_the_store(tmp_path):
+    customers = generate_customer_list(3000, seed=5)
+    store = CustomerStore(str(tmp_path / 'customers.db'))
+    merge_customers_incremental(customers.iloc[:1500], store, {'verbose': False, 'max_description_length': 5})
+    merged, _ = merge_customers_incremental(customers.iloc[1500:], store, QUIET)
+    expected, _ = merge_customers(customers, QUIET)
+    pd.testing.assert_frame_equal(merged.reset_index(drop=True), expected.reset_index(drop=True))
+    assert np.nanmax(merged['description'].map(lambda text: len(text) if isinstance(text, str) else np.nan)) > 5
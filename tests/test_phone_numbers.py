@@ -0,0 +1,92 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from file import clean_phone_number, clean_phone_numbers, format_phone_10_digits, format_phones_10_digits
+
+# Characters phone cells are built from: ASCII digits (heavy on 0 and 9), separators,
+# letters and non-ASCII digits (Persian, Arabic-Indic, superscript)
+PHONE_ALPHABET = '0123456789999000 -+()x۰۱۹٣²'
+
+
+def random_phone_values(seed, count=20000):
+    rng = random.Random(seed)
+    values = []
+    for _ in range(count):
+        kind = rng.randrange(8)
+        if kind == 0:
+            values.append(''.join(rng.choice(PHONE_ALPHABET) for _ in range(rng.randrange(0, 20))))
+        elif kind == 1:
+            values.append(int(''.join(rng.choice('09') for _ in range(rng.randrange(1, 15)))))
+        elif kind == 2:
+            values.append(float(rng.randrange(10 ** 9, 10 ** 13)))
+        elif kind == 3:
+            values.append(None if rng.random() < 0.5 else np.nan)
+        elif kind == 4:
+            values.append(''.join(rng.choice('0123456789') for _ in range(rng.randrange(8, 16))))
+        elif kind == 5:
+            values.append('0098' + ''.join(rng.choice('0123456789') for _ in range(rng.randrange(8, 12))))
+        elif kind == 6:
+            # Numbers typed with Persian digits
+            values.append(''.join('۰۱۲۳۴۵۶۷۸۹'[int(d)] for d in '09' + ''.join(rng.choice('0123456789') for _ in range(9))))
+        else:
+            values.append('0' + str(rng.randrange(9 * 10 ** 9, 10 ** 10)))
+    return values
+
+
+def same_value(expected, actual):
+    # NaN and None must come back as they went in, not just as "missing"
+    if isinstance(expected, float) and np.isnan(expected):
+        return isinstance(actual, float) and np.isnan(actual)
+    return type(expected) is type(actual) and expected == actual
+
+
+def series_cases(seed):
+    values = random_phone_values(seed)
+    text = [value for value in values if isinstance(value, str)]
+    return {
+        'object': pd.Series(values, dtype=object),
+        'int': pd.Series([value for value in values if isinstance(value, int)]),
+        'float': pd.Series([value for value in values if isinstance(value, float)]),
+        'str': pd.Series(text + [None], dtype='str'),
+        'shuffled_index': pd.Series(values, index=np.random.default_rng(seed).permutation(len(values)), dtype=object),
+    }
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('case', ['object', 'int', 'float', 'str', 'shuffled_index'])
+def test_clean_phone_numbers_matches_scalar(seed, case):
+    series = series_cases(seed)[case]
+    result = clean_phone_numbers(series)
+    assert result.index.equals(series.index)
+    mismatches = [
+        (value, expected, actual)
+        for value, expected, actual in zip(series, map(clean_phone_number, series), result)
+        if not same_value(expected, actual)
+    ]
+    assert not mismatches, mismatches[:5]
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('case', ['object', 'int', 'float', 'str', 'shuffled_index'])
+def test_format_phones_10_digits_matches_scalar(seed, case):
+    series = series_cases(seed)[case]
+    result = format_phones_10_digits(series)
+    assert result.index.equals(series.index)
+    mismatches = [
+        (value, expected, actual)
+        for value, expected, actual in zip(series, map(format_phone_10_digits, series), result)
+        if not same_value(expected, actual)
+    ]
+    assert not mismatches, mismatches[:5]
+
+
+def test_edge_values():
+    values = [None, np.nan, '', '9', '۰۹۱۲۳۴۵۶۷۸۹', '0912 345 6789', '+98 912 345 6789', 9123456789, 9123456789.0, '²9123456789']
+    series = pd.Series(values, dtype=object)
+    assert clean_phone_numbers(series).tolist() == [clean_phone_number(value) for value in values]
+    formatted = format_phones_10_digits(series).tolist()
+    expected = [format_phone_10_digits(value) for value in values]
+    assert all(same_value(e, a) for e, a in zip(expected, formatted)), list(zip(expected, formatted))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import _noisy_phones
+from rfm import compute_rfm, compute_rfm_incremental, dropped_orders_message
+from rfm_store import RfmStore
+
+
+def random_orders(n_orders, seed):
+    # Orders of a quarter as many customers, a few of them buying often, with noisy
+    # phone numbers, two years of dates and amounts with cents
+    rng = np.random.default_rng(seed)
+    n_customers = max(1, n_orders // 4)
+    phones = (9_000_000_000 + rng.choice(999_999_999, n_customers, replace=False)).astype(str)
+    customer = (rng.pareto(1.5, n_orders) * n_customers / 20).astype(int) % n_customers
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 730, n_orders), 'D')
+    return pd.DataFrame({
+        'numberr': _noisy_phones(rng, phones[customer]),
+        'date': dates,
+        'amount': rng.integers(1, 500_000, n_orders) / 100,
+    })
+
+
+@pytest.mark.parametrize('seed, cuts', [(1, [3000]), (2, [500, 501, 4000]), (3, [1, 5999])])
+def test_incremental_rfm_equals_full_rebuild(tmp_path, seed, cuts):
+    orders = random_orders(6000, seed)
+    store = RfmStore(str(tmp_path / 'rfm.db'))
+    for start, end in zip([0] + cuts, cuts + [len(orders)]):
+        scored = compute_rfm_incremental(orders.iloc[start:end], store)
+
+    stats = {}
+    pd.testing.assert_frame_equal(scored, compute_rfm(orders, stats=stats))
+    # The store counts the orders it used, not the skipped ones
+    assert store.get_order_count() == stats['orders'] - stats['invalid_phone'] - stats['invalid_date']
+
+
+def test_dates_in_mixed_layouts_and_excel_serials():
+    orders = pd.DataFrame({
+        'numberr': ['09121234567', '09121234567', '09121234568', '09121234569', '09121234570', 'no phone'],
+        # Text in two layouts, an Excel serial day (2024-01-08), and a number that is no date
+        'date': ['2024-01-05', '2024/01/06', 45299, 20240105, 'not a date', '2024-01-05'],
+        'amount': [100, 200, 300, 400, 500, 600],
+    }, dtype=object)
+    stats = {}
+    scored = compute_rfm(orders, stats=stats)
+
+    by_number = scored.set_index('numberr')
+    assert by_number.loc['9121234567', 'frequency'] == 2
+    assert by_number.loc['9121234567', 'last_purchase'] == pd.Timestamp('2024-01-06')
+    assert by_number.loc['9121234568', 'last_purchase'] == pd.Timestamp('2024-01-08')
+    assert len(scored) == 2
+    assert stats == {'orders': 6, 'invalid_phone': 1, 'invalid_date': 2}
+    assert dropped_orders_message(stats).startswith('3 of 6 orders skipped')
+
+
+def test_numeric_date_column_is_read_as_excel_serials():
+    orders = pd.DataFrame({'numberr': ['09121234567', '09121234568'], 'date': [45296, 20240105], 'amount': [1, 2]})
+    stats = {}
+    scored = compute_rfm(orders, stats=stats)
+    assert scored['last_purchase'].tolist() == [pd.Timestamp('2024-01-05')]
+    assert stats['invalid_date'] == 1